@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import List
+from typing import List, Optional
 from datetime import datetime
 
 @dataclass
@@ -18,6 +18,13 @@ class Product:
     created_at: datetime
     updated_at: datetime
 
+@dataclass
+class ProductPage:
+    items: List[Product]
+    page: int
+    has_next: bool
+    count: Optional[int] = None
+
 @dataclass
 class User:
     id: int
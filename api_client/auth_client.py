@@ -1,30 +1,34 @@
-from enum import Enum
-from typing import Final
-
-import aiohttp
+import logging
+import time
+from typing import Final, Optional
 
+from api_client.base_client import BackendClient, current_auth
 from api_client.exceptions.common import ApiClientError
+from api_client.jwt_claims import decode_token, get_expiry, get_staff_claim, is_signature_verification_enabled
 from config import settings
+from redis_client.auth_state import AuthState, AuthStateRepository
 from redis_client.connection import RedisConnection
+from redis_client.token_cache import TokenCache
+from redis_client.user_keys import UserKeyRegistry
 
+logger = logging.getLogger(__name__)
 
-class TokenPrefix(Enum):
-    ACCESS = "access_token:"
-    REFRESH = "refresh_token:"
-    IS_STAFF = "is_staff:"
+# Sorted set of telegram ids scored by the expiry time of their access token
+TOKEN_EXPIRY_KEY = "auth:token_expiry"
 
 
-class AuthClient:
+class AuthClient(BackendClient):
     BASE_URL = settings.AUTH_API_URL
-
-    @staticmethod
-    async def _extract_data(response: aiohttp.ClientResponse) -> dict:
-        response_json = await response.json()
-        if not response_json.get("success", True):
-            raise ApiClientError(
-                message=response_json.get("message", "Unknown error"),
-                response_errors=response_json.get("errors", {}), )
-        return response_json.get("data", {})
+    # Token endpoints must not carry a possibly expired bearer token
+    AUTHENTICATE = False
+    TIMEOUTS = {
+        "auth.register": 15.0,
+        "auth.token.create": 10.0,
+        "auth.token.refresh": 5.0,
+        "auth.token.verify": 5.0,
+        "auth.token.destroy": 5.0,
+        "auth.me.is_staff": 3.0,
+    }
 
     @classmethod
     async def register(cls, user_data: dict):
@@ -32,11 +36,9 @@ class AuthClient:
         POST /api/v1/auth/register/
         Registers a new user.
         """
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                    f"{cls.BASE_URL}register/", json=user_data
-            ) as response:
-                return await cls._extract_data(response)
+        return await cls._request(
+            "POST", "register/", endpoint="auth.register", json=user_data
+        )
 
     @classmethod
     async def create_token(cls, credentials: dict):
@@ -51,29 +53,18 @@ class AuthClient:
         pool = await RedisConnection.get_pool()
         await cls._cleanup_telegram_id_keys(pool, telegram_id)
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                    f"{cls.BASE_URL}token/create/", json=credentials
-            ) as response:
-                data = await cls._extract_data(response)
-                token_data = data.get("data", {})
-                access = token_data.get("access")
-                refresh = token_data.get("refresh")
-
-                # Cache tokens for one hour (3600 seconds); adjust expiration as needed.
-                if access:
-                    await pool.set(
-                        f"{TokenPrefix.ACCESS.value}{telegram_id}",
-                        access,
-                        ex=settings.ACCESS_TOKEN_LIFETIME,
-                    )
-                if refresh:
-                    await pool.set(
-                        f"{TokenPrefix.REFRESH.value}{telegram_id}",
-                        refresh,
-                        ex=settings.REFRESH_TOKEN_LIFETIME,
-                    )
-                return data
+        data = await cls._request(
+            "POST", "token/create/", endpoint="auth.token.create", json=credentials
+        )
+        token_data = data.get("data", {})
+        access = token_data.get("access")
+        refresh = token_data.get("refresh")
+
+        # Cache tokens for their configured lifetimes
+        await cls._store_tokens(pool, telegram_id, access, refresh)
+        await TokenCache.invalidate(telegram_id)
+        cls._reset_auth_context(telegram_id)
+        return data
 
     @classmethod
     async def destroy_token(cls, telegram_id: int):
@@ -84,130 +75,144 @@ class AuthClient:
         """
         # Get refresh token from Redis
         pool = await RedisConnection.get_pool()
-        refresh_token = await pool.get(f"{TokenPrefix.REFRESH.value}{telegram_id}")
+        refresh_token = (await AuthStateRepository.get(pool, telegram_id)).refresh
 
         # Only call the API if we have a valid refresh token
         if refresh_token:
             # Call API to destroy token server-side with refresh token
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                        f"{cls.BASE_URL}token/destroy/",
-                        json={"refresh": refresh_token}
-                ) as response:
-                    result = await cls._extract_data(response)
+            result = await cls._request(
+                "POST", "token/destroy/", endpoint="auth.token.destroy",
+                json={"refresh": refresh_token}
+            )
         else:
             # No refresh token available, so return an empty result
             result = {}
 
         # Clean up all keys related to this telegram_id from Redis
         await cls._cleanup_telegram_id_keys(pool, telegram_id)
+        await pool.zrem(TOKEN_EXPIRY_KEY, str(telegram_id))
+        await TokenCache.invalidate(telegram_id)
+        cls._reset_auth_context(telegram_id)
 
         return result
 
+    @staticmethod
+    def _reset_auth_context(telegram_id) -> None:
+        """
+        Forget the auth state the current update memoized for the user, which
+        logging in or out has just changed.
+        """
+        context = current_auth.get()
+        if context is not None and str(context.telegram_id) == str(telegram_id):
+            context.reset()
+
     @classmethod
     async def refresh_token(cls, token: dict):
         """
         POST /api/v1/auth/token/refresh/
-        Refreshes tokens and caches the new refresh token in Redis.
-        """
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                    f"{cls.BASE_URL}token/refresh/", json=token
-            ) as response:
-                data = await cls._extract_data(response)
-                new_refresh = data.get("refresh")
-                telegram_id = token.get("telegram_id", "unknown")
-                if new_refresh:
-                    pool = await RedisConnection.get_pool()
-                    await pool.set(f"{TokenPrefix.REFRESH.value}{telegram_id}", new_refresh, ex=3600)
-                return data
+        Refreshes tokens and caches the new access and refresh tokens in Redis.
+        """
+        data = await cls._request(
+            "POST", "token/refresh/", endpoint="auth.token.refresh", json=token
+        )
+        new_access = data.get("access")
+        new_refresh = data.get("refresh")
+        telegram_id = token.get("telegram_id", "unknown")
+        pool = await RedisConnection.get_pool()
+        await cls._store_tokens(pool, telegram_id, new_access, new_refresh)
+        await TokenCache.invalidate(telegram_id)
+        return data
 
     @classmethod
     async def verify_token(cls, token: dict):
         """
         POST /api/v1/auth/token/verify/
         Verifies a token.
+        Verified locally when the backend's signing key is configured.
         """
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                    f"{cls.BASE_URL}token/verify/", json=token
-            ) as response:
-                return await cls._extract_data(response)
+        if is_signature_verification_enabled():
+            if decode_token(token.get("token")) is None:
+                raise ApiClientError(message="Token is invalid or expired", status=401)
+            return {}
+        return await cls._request(
+            "POST", "token/verify/", endpoint="auth.token.verify", json=token
+        )
 
     @classmethod
-    async def is_staff(cls, telegram_id: str) -> bool:
+    async def is_staff(cls, telegram_id: str, state: Optional[AuthState] = None) -> bool:
         """
         GET /api/v1/auth/me/is-staff/
         Check if the current user is staff.
-        Caches the result for one hour.
+        Caches the result in-process and in Redis for one hour.
+        An already fetched ``state`` saves the Redis lookup.
         """
-        print('IsStaff Checking staff status for telegram_id:', telegram_id)
+        hit, is_staff = TokenCache.get_staff(telegram_id)
+        if hit:
+            return is_staff
+
         pool = await RedisConnection.get_pool()
 
         # Define a timeout for caching the is_staff status
         IS_STAFF_TIMEOUT: Final[int] = 3600
 
-        # Debug information
-        staff_key = f"{TokenPrefix.IS_STAFF.value}{telegram_id}"
-        access_key = f"{TokenPrefix.ACCESS.value}{telegram_id}"
-        print(f'Checking cached staff status with key: {staff_key}')
-
-        # Try to get from cache first
-        cached_result = await pool.get(staff_key)
-        if cached_result is not None:
-            is_staff_result = cached_result.decode() == "True"
-            print(f'Found cached staff status: {is_staff_result}')
-            return is_staff_result
-
-        # Get access token from Redis
-        access_token = await pool.get(access_key)
-        if not access_token:
+        # Staff status and access token come back in a single round trip
+        if state is None:
+            state = await AuthStateRepository.get(pool, telegram_id)
+        if state.is_staff is not None:
+            TokenCache.set_staff(telegram_id, state.is_staff)
+            return state.is_staff
+
+        if not state.access:
             # No token available, user cannot be staff
-            print(f'No access token found for telegram_id: {telegram_id}')
-            await pool.set(staff_key, "False", ex=IS_STAFF_TIMEOUT)
-            return False
-
-        # Decode the access token from bytes to string
-        access_token = access_token.decode()
-        print(f'Found access token, making API request to check staff status')
-
-        # Make API request to check staff status with authorization
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                        f"{cls.BASE_URL}me/is-staff/",
-                        headers={"Authorization": f"Bearer {access_token}"}
-                ) as response:
-                    try:
-                        data = await cls._extract_data(response)
-                        is_staff = data.get("is_staff", False)
-                        print(f'API response for is_staff: {is_staff}')
-                    except ApiClientError as e:
-                        print(f'API error when checking staff status: {str(e)}')
-                        is_staff = False
-
-                    # Cache the result for one hour
-                    await pool.set(staff_key, str(is_staff), ex=IS_STAFF_TIMEOUT)
-                    return is_staff
-        except Exception as e:
-            print(f'Exception when making staff status request: {str(e)}')
-            await pool.set(staff_key, "False", ex=IS_STAFF_TIMEOUT)
-            return False
+            is_staff = False
+        elif (claim := get_staff_claim(state.access)) is not None:
+            # The verified access token already says whether the user is staff
+            is_staff = claim
+        else:
+            # Make API request to check staff status with authorization
+            try:
+                data = await cls._request(
+                    "GET", "me/is-staff/", endpoint="auth.me.is_staff",
+                    headers={"Authorization": f"Bearer {state.access}"}
+                )
+                is_staff = bool(data.get("is_staff", False))
+            except ApiClientError as e:
+                logger.warning(f"Staff status check failed for {telegram_id}: {e}")
+                is_staff = False
+
+        await AuthStateRepository.set_is_staff(pool, telegram_id, is_staff, IS_STAFF_TIMEOUT)
+        TokenCache.set_staff(telegram_id, is_staff)
+        return is_staff
 
-    @classmethod
-    async def _cleanup_telegram_id_keys(cls, pool, telegram_id: str):
-        """
-        Remove all keys containing the telegram_id from Redis.
-        This will remove any key that contains the telegram_id, not just the predefined ones.
-        """
-        # Use scan_iter for pattern matching to avoid blocking Redis
-        pattern = f"*{telegram_id}*"
-        matching_keys = []
-        print('Cleaning up Redis keys with pattern:', pattern)
-        async for key in pool.scan_iter(match=pattern):
-            print('Redis key:', key)
-            matching_keys.append(key)
-
-        if matching_keys:
-            print(matching_keys)
-            await pool.delete(*matching_keys)
+    @staticmethod
+    async def _store_tokens(pool, telegram_id, access: Optional[str], refresh: Optional[str]) -> None:
+        """
+        Store the user's tokens and record when the access token expires so
+        it can be refreshed ahead of time.
+        """
+        if not access and not refresh:
+            return
+        # Prefer the expiry encoded in the tokens over the configured lifetimes
+        access_expires_at = get_expiry(access) or time.time() + settings.ACCESS_TOKEN_LIFETIME
+        async with pool.pipeline(transaction=True) as pipe:
+            AuthStateRepository.stage_tokens(
+                pipe, telegram_id, access, refresh,
+                access_expires_at=access_expires_at, refresh_expires_at=get_expiry(refresh),
+            )
+            if access:
+                pipe.zadd(TOKEN_EXPIRY_KEY, {str(telegram_id): access_expires_at})
+            await pipe.execute()
+
+    @staticmethod
+    async def _cleanup_telegram_id_keys(pool, telegram_id: str):
+        """
+        Remove every key written for the telegram_id from Redis.
+
+        Keys are looked up in the user's key index rather than by scanning the
+        keyspace. The legacy token keys are always included so that users
+        stored before the auth state hash existed are removed too. Token usage
+        is kept, so quotas outlive the session (see TokenUsage).
+        """
+        await UserKeyRegistry.delete_all(
+            pool, telegram_id, AuthStateRepository.key(telegram_id), *AuthStateRepository.legacy_keys(telegram_id)
+        )
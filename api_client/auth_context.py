@@ -0,0 +1,127 @@
+import asyncio
+import time
+from contextvars import Token
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from api_client.auth_client import AuthClient
+from api_client.base_client import current_auth
+from api_client.jwt_claims import get_expiry
+from api_client.token_refresher import TokenRefresher
+from config import settings
+from redis_client.auth_state import AuthState, AuthStateRepository
+from redis_client.connection import RedisConnection
+from redis_client.token_cache import TokenCache
+
+
+class AuthContext:
+    """
+    Auth state of the user behind the update being handled.
+
+    Created by AuthMiddleware for every update and exposed through a context
+    variable, so API clients and filters pick it up without it being passed
+    around. Nothing is looked up until a handler asks for it; each value is
+    then resolved once and memoized for the rest of the update, and the
+    Redis-backed values share a single lookup.
+    """
+
+    def __init__(self, telegram_id: int):
+        self.telegram_id = telegram_id
+        self._resolved: Dict[str, asyncio.Future] = {}
+
+    async def _memoize(self, name: str, resolve: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Resolve a value once, sharing the result with concurrent callers.
+        """
+        future = self._resolved.get(name)
+        if future is None:
+            future = asyncio.ensure_future(resolve())
+            self._resolved[name] = future
+        return await asyncio.shield(future)
+
+    async def get_state(self) -> AuthState:
+        """
+        The user's tokens and cached staff flag, read from Redis in one round trip.
+        """
+        async def resolve() -> AuthState:
+            pool = await RedisConnection.get_pool()
+            return await AuthStateRepository.get(pool, self.telegram_id)
+
+        return await self._memoize("state", resolve)
+
+    async def get_token(self) -> Optional[str]:
+        """
+        The user's access token, refreshed if only the refresh token is left.
+        """
+        return await self._memoize("token", self._resolve_token)
+
+    async def _resolve_token(self) -> Optional[str]:
+        await TokenRefresher.touch(self.telegram_id)
+
+        hit, access_token = TokenCache.get(self.telegram_id)
+        if hit:
+            return access_token
+
+        state = await self.get_state()
+        if state.access:
+            TokenCache.set(self.telegram_id, state.access, state.access_ttl())
+            return state.access
+
+        # Concurrent messages from the same user share a single refresh
+        if state.refresh:
+            try:
+                access_token = await TokenRefresher.refresh(self.telegram_id)
+            except Exception:
+                access_token = None
+            if access_token:
+                expires_at = get_expiry(access_token)
+                ttl = expires_at - time.time() if expires_at else settings.ACCESS_TOKEN_LIFETIME
+                TokenCache.set(self.telegram_id, access_token, ttl)
+            return access_token
+
+        TokenCache.set(self.telegram_id, None, settings.TOKEN_CACHE_NEGATIVE_TTL)
+        return None
+
+    async def is_authenticated(self) -> bool:
+        """
+        Whether the user holds an access or a refresh token.
+        """
+        hit, access_token = TokenCache.get(self.telegram_id)
+        if hit and access_token:
+            return True
+        return (await self.get_state()).is_authenticated
+
+    async def is_staff(self) -> bool:
+        """
+        Whether the user has staff privileges.
+        """
+        async def resolve() -> bool:
+            hit, is_staff = TokenCache.get_staff(self.telegram_id)
+            if hit:
+                return is_staff
+            return await AuthClient.is_staff(str(self.telegram_id), state=await self.get_state())
+
+        return await self._memoize("is_staff", resolve)
+
+    def reset(self) -> None:
+        """
+        Forget the memoized values, e.g. after logging the user in or out.
+        """
+        self._resolved.clear()
+
+
+def get_auth_context() -> Optional[AuthContext]:
+    """
+    Get the auth context of the update being handled, if any.
+    """
+    return current_auth.get()
+
+
+def set_auth_context(context: Optional[AuthContext]) -> Token:
+    """
+    Make ``context`` the current auth context; returns a token for ``reset_auth_context``.
+    """
+    return current_auth.set(context)
+
+
+def reset_auth_context(token: Token) -> None:
+    current_auth.reset(token)
@@ -0,0 +1,344 @@
+import asyncio
+import functools
+import hashlib
+import json
+import logging
+import random
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional
+
+import aiohttp
+
+from api_client.exceptions.common import ApiClientError
+from api_client.response_cache import CachedResponse, ResponseCache
+from api_client.sessions import SessionRegistry, Upstream
+from api_client.single_flight import SingleFlight
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Auth context of the update being handled, set by AuthMiddleware for each
+# update (see api_client.auth_context). Anything with an async ``get_token()``.
+current_auth: ContextVar[Optional[Any]] = ContextVar("current_auth", default=None)
+
+
+@dataclass
+class RequestStats:
+    """
+    Latency and attempt counters for a single backend endpoint.
+    """
+    requests: int = 0
+    coalesced: int = 0
+    cache_hits: int = 0
+    not_modified: int = 0
+    attempts: int = 0
+    retries: int = 0
+    failures: int = 0
+    total_latency: float = 0.0
+    max_latency: float = 0.0
+
+    @property
+    def avg_latency(self) -> float:
+        sent = self.requests - self.coalesced - self.cache_hits
+        return self.total_latency / sent if sent else 0.0
+
+
+class BackendClient:
+    """
+    Base class for asynchronous clients of the Django backend.
+
+    Every request goes through ``_request`` which draws a connection from the
+    shared backend session, applies the endpoint's timeout budget, retries
+    idempotent requests with jittered exponential backoff and maps every
+    failure to ``ApiClientError``. GET requests made with ``coalesce=True``
+    share a single in-flight call with identical concurrent requests, and
+    GET requests made with ``cache_tags`` go through the two-tier response cache.
+    Requests are authenticated as the user of the current update unless they
+    carry their own Authorization header.
+
+    Attributes:
+        BASE_URL: Root URL the request paths are appended to
+        AUTHENTICATE: Whether requests use the current update's access token by default
+        TIMEOUTS: Per-endpoint timeout budgets in seconds, keyed by endpoint name
+        RETRYABLE_STATUSES: HTTP statuses that are retried for idempotent requests
+    """
+    BASE_URL: str = settings.API_V1_URL
+    AUTHENTICATE: bool = True
+    TIMEOUTS: Dict[str, float] = {}
+    IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+    RETRYABLE_STATUSES = frozenset({429, 502, 503, 504})
+
+    _stats: Dict[str, RequestStats] = {}
+    _single_flight = SingleFlight()
+    _cache = ResponseCache()
+
+    @staticmethod
+    def _extract_data(payload: Any) -> Any:
+        """
+        Unwraps the backend's ``{"success", "message", "data"}`` envelope.
+        Raises ApiClientError if the response indicates failure.
+        Payloads that are not wrapped in an envelope are returned as-is.
+        """
+        if not isinstance(payload, dict) or not ("success" in payload or "data" in payload):
+            return payload
+        if not payload.get("success", True):
+            raise ApiClientError(
+                message=payload.get("message", "Unknown error"),
+                response_errors=payload.get("errors", {}), )
+        return payload.get("data", {})
+
+    @staticmethod
+    def _serialize_json(body: Any) -> bytes:
+        """
+        Serialize a JSON body in the canonical form the backend verifies signatures
+        against, so the signed bytes are exactly the bytes sent on the wire.
+        """
+        return json.dumps(body, separators=(',', ':'), sort_keys=True, ensure_ascii=True).encode('utf-8')
+
+    @classmethod
+    def _get_timeout(cls, endpoint: str) -> float:
+        """
+        Return the timeout budget for an endpoint, falling back to the default.
+        """
+        return cls.TIMEOUTS.get(endpoint, settings.BACKEND_TIMEOUT)
+
+    @staticmethod
+    def _get_backoff(attempt: int) -> float:
+        """
+        Full-jitter exponential backoff delay for the given retry attempt.
+        """
+        ceiling = min(
+            settings.BACKEND_RETRY_BACKOFF_MAX,
+            settings.BACKEND_RETRY_BACKOFF * (2 ** attempt),
+        )
+        return random.uniform(0, ceiling)
+
+    @classmethod
+    def get_stats(cls) -> Dict[str, RequestStats]:
+        """
+        Return the request counters collected so far, keyed by endpoint name.
+        """
+        return dict(cls._stats)
+
+    @classmethod
+    def get_coalesced_count(cls) -> int:
+        """
+        Return how many backend calls were collapsed into an in-flight request.
+        """
+        return cls._single_flight.collapsed
+
+    @staticmethod
+    def _get_auth_scope(headers: Optional[dict]) -> str:
+        """
+        Derive a non-reversible cache scope from the request's Authorization header.
+        """
+        authorization = (headers or {}).get("Authorization")
+        if not authorization:
+            return "anonymous"
+        return hashlib.sha256(authorization.encode()).hexdigest()[:16]
+
+    @classmethod
+    def _get_flight_key(cls, url: str, params: Optional[dict], headers: Optional[dict]) -> Hashable:
+        """
+        Build the key identifying identical GET requests.
+        """
+        normalized_params = tuple(sorted((str(k), str(v)) for k, v in (params or {}).items()))
+        return url, normalized_params, cls._get_auth_scope(headers)
+
+    @classmethod
+    async def _get_auth_headers(cls, headers: Optional[dict], auth: Optional[bool]) -> Optional[dict]:
+        """
+        Add the current update's access token to ``headers`` when the request should be authenticated.
+        """
+        context = current_auth.get()
+        if context is None or not (cls.AUTHENTICATE if auth is None else auth):
+            return headers
+        if headers and "Authorization" in headers:
+            return headers
+        token = await context.get_token()
+        if not token:
+            return headers
+        return {**(headers or {}), "Authorization": f"Bearer {token}"}
+
+    @classmethod
+    async def _decode_response(cls, response: aiohttp.ClientResponse) -> Any:
+        """
+        Decode a JSON response body and unwrap it.
+        Raises ApiClientError for error statuses and malformed bodies.
+        """
+        if response.status == 204:
+            return None
+
+        try:
+            payload = await response.json(content_type=None)
+        except ValueError:
+            raise ApiClientError(
+                message=f"Invalid response from backend (status {response.status})",
+                status=response.status, )
+
+        if response.status >= 400:
+            # Error responses may or may not use the envelope
+            if isinstance(payload, dict):
+                raise ApiClientError(
+                    message=payload.get("message") or payload.get("detail") or f"HTTP {response.status}",
+                    response_errors=payload.get("errors", payload),
+                    status=response.status, )
+            raise ApiClientError(message=f"HTTP {response.status}", status=response.status)
+
+        return cls._extract_data(payload)
+
+    @classmethod
+    async def _request(cls, method: str, path: str = "", *, endpoint: str,
+                       timeout: Optional[float] = None, coalesce: bool = False,
+                       cache_tags: Optional[Iterable[str]] = None, cache_ttl: Optional[float] = None,
+                       auth: Optional[bool] = None, **kwargs) -> Any:
+        """
+        Perform a request against ``BASE_URL + path`` and return the decoded data.
+
+        Args:
+            method: HTTP method
+            path: Path relative to ``BASE_URL``
+            endpoint: Endpoint name used for timeout budgets and counters
+            timeout: Overrides the endpoint's timeout budget
+            coalesce: Share the call with identical in-flight GET requests.
+                      The returned data is shared and must not be mutated.
+            cache_tags: Cache the GET response under these tags. Fresh entries are
+                        served without a request, stale ones are revalidated with
+                        If-None-Match / If-Modified-Since.
+            cache_ttl: Freshness window for cached responses, in seconds
+            auth: Send the current update's access token; defaults to ``AUTHENTICATE``.
+                  Cached and coalesced responses are scoped to the token sent.
+            **kwargs: Passed through to ``aiohttp.ClientSession.request``
+        """
+        method = method.upper()
+        url = f"{cls.BASE_URL}{path}"
+        # Resolve auth before the flight and cache keys, which are scoped to the Authorization header
+        headers = await cls._get_auth_headers(kwargs.get("headers"), auth)
+        if headers is not None:
+            kwargs["headers"] = headers
+        if "json" in kwargs:
+            kwargs["data"] = cls._serialize_json(kwargs.pop("json"))
+            kwargs["headers"] = {**(kwargs.get("headers") or {}), "Content-Type": "application/json"}
+        stats = cls._stats.setdefault(f"{cls.__name__}.{endpoint}", RequestStats())
+        stats.requests += 1
+
+        if method != "GET" or (not coalesce and cache_tags is None):
+            return await cls._send(method, url, endpoint, stats, timeout, **kwargs)
+
+        key = cls._get_flight_key(url, kwargs.get("params"), kwargs.get("headers"))
+        send = functools.partial(cls._send, method, url, endpoint, stats, timeout, **kwargs)
+
+        if cache_tags is not None:
+            cache_key = hashlib.sha256(repr(key).encode()).hexdigest()
+            cached = await cls._cache.get(cache_key)
+            if cached is not None and cached.is_fresh(cache_ttl or settings.RESPONSE_CACHE_TTL):
+                stats.cache_hits += 1
+                return cached.data
+            send = functools.partial(
+                cls._revalidate, send, stats, cache_key, cached, tuple(cache_tags), kwargs.get("headers")
+            )
+
+        if coalesce:
+            if cls._single_flight.is_in_flight(key):
+                stats.coalesced += 1
+            return await cls._single_flight.do(key, send)
+        return await send()
+
+    @classmethod
+    async def _revalidate(cls, send: Callable[..., Awaitable[Any]], stats: RequestStats, cache_key: str,
+                          cached: Optional[CachedResponse], tags: tuple, headers: Optional[dict]) -> Any:
+        """
+        Fetch a cacheable GET, sending validators from a stale entry when available,
+        and store the outcome in the response cache.
+        """
+        if cached is not None and cached.can_revalidate:
+            headers = {**(headers or {}), **cached.conditional_headers()}
+
+        async def handle(response: aiohttp.ClientResponse) -> CachedResponse:
+            if response.status == 304 and cached is not None:
+                stats.not_modified += 1
+                return CachedResponse(cached.data, cached.etag, cached.last_modified, time.time())
+            return CachedResponse(
+                data=await cls._decode_response(response),
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
+                stored_at=time.time(),
+            )
+
+        entry = await send(handler=handle, headers=headers)
+        await cls._cache.set(cache_key, entry, tags)
+        return entry.data
+
+    @classmethod
+    async def _invalidate_cache(cls, *tags: str) -> None:
+        """
+        Drop cached responses registered under any of the given tags.
+        """
+        await cls._cache.invalidate(*tags)
+
+    @classmethod
+    async def _send(cls, method: str, url: str, endpoint: str, stats: RequestStats,
+                    timeout: Optional[float] = None,
+                    handler: Optional[Callable[[aiohttp.ClientResponse], Awaitable[Any]]] = None,
+                    **kwargs) -> Any:
+        """
+        Send a request with the endpoint's timeout budget and retry policy.
+        The response is decoded by ``handler``, or ``_decode_response`` by default.
+        """
+        budget = timeout if timeout is not None else cls._get_timeout(endpoint)
+        max_retries = settings.BACKEND_MAX_RETRIES if method in cls.IDEMPOTENT_METHODS else 0
+        handler = handler or cls._decode_response
+        started = time.monotonic()
+
+        try:
+            session = await SessionRegistry.get_session(Upstream.BACKEND)
+            attempt = 0
+            while True:
+                stats.attempts += 1
+                try:
+                    async with session.request(
+                            method, url, timeout=aiohttp.ClientTimeout(total=budget), **kwargs
+                    ) as response:
+                        if response.status in cls.RETRYABLE_STATUSES and attempt < max_retries:
+                            raise _RetryableStatus(response.status)
+                        return await handler(response)
+                except (_RetryableStatus, aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                    if attempt >= max_retries:
+                        raise cls._map_error(e, endpoint)
+                    delay = cls._get_backoff(attempt)
+                    logger.warning(f"Retrying {method} {endpoint} in {delay:.2f}s after: {e!r}")
+                    attempt += 1
+                    stats.retries += 1
+                    await asyncio.sleep(delay)
+                except aiohttp.ClientError as e:
+                    raise cls._map_error(e, endpoint)
+        except ApiClientError:
+            stats.failures += 1
+            raise
+        finally:
+            elapsed = time.monotonic() - started
+            stats.total_latency += elapsed
+            stats.max_latency = max(stats.max_latency, elapsed)
+
+    @staticmethod
+    def _map_error(error: Exception, endpoint: str) -> ApiClientError:
+        """
+        Translate transport-level failures into ApiClientError.
+        """
+        if isinstance(error, _RetryableStatus):
+            return ApiClientError(message=f"Backend unavailable (HTTP {error.status})", status=error.status)
+        if isinstance(error, asyncio.TimeoutError):
+            return ApiClientError(message=f"Request to {endpoint} timed out")
+        return ApiClientError(message=f"Network error while calling {endpoint}: {error}")
+
+
+class _RetryableStatus(Exception):
+    """
+    Internal signal for a transient HTTP status that should be retried.
+    """
+
+    def __init__(self, status: int):
+        super().__init__(f"HTTP {status}")
+        self.status = status
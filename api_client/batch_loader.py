@@ -0,0 +1,107 @@
+import asyncio
+from contextvars import ContextVar, copy_context
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+
+class BatchLoader:
+    """
+    DataLoader-style batching of individual lookups.
+
+    Every key requested through ``load`` in the same event-loop tick (or
+    within ``batch_delay`` seconds of the first one) is collected and
+    resolved with a single call to ``batch_fn``. Results are memoized for
+    the rest of the current update: aiogram handles each update in its own
+    task, so the memo lives in a context variable scoped to that task.
+
+    Keys are only batched with keys requested in the same scope, as given
+    by ``scope_fn`` in the caller's context, and each batch runs in the
+    context of one of its callers. Lookups that depend on who is asking,
+    such as the user whose token authenticates them, are therefore never
+    answered with another scope's results.
+
+    Attributes:
+        batches: Number of batch calls made
+        loaded: Number of keys resolved through batch calls
+    """
+
+    def __init__(self, batch_fn: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]],
+                 max_batch_size: int = 100, batch_delay: float = 0.0, name: str = "loader",
+                 scope_fn: Callable[[], Hashable] = None):
+        """
+        Args:
+            batch_fn: Resolves a list of keys to a mapping of key to value.
+                      A value that is an exception is raised to that key's callers.
+            max_batch_size: Maximum number of keys passed to a single ``batch_fn`` call
+            batch_delay: Seconds to wait for more keys before dispatching; 0 means one loop tick
+            name: Name of the per-update memo context variable
+            scope_fn: Returns the caller's scope; every caller shares one scope by default
+        """
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.batch_delay = batch_delay
+        self.scope_fn = scope_fn or (lambda: None)
+        self._pending: Dict[Hashable, Dict[Hashable, asyncio.Future]] = {}
+        self._memo: ContextVar[Optional[Dict[Hashable, asyncio.Future]]] = ContextVar(f"{name}_memo", default=None)
+        self.batches = 0
+        self.loaded = 0
+
+    async def load(self, key: Hashable) -> Any:
+        """
+        Resolve a single key, batched with every other key requested in the same tick.
+        """
+        memo = self._memo.get()
+        if memo is None:
+            memo = {}
+            self._memo.set(memo)
+
+        future = memo.get(key)
+        if future is None:
+            scope = self.scope_fn()
+            future = self._pending.get(scope, {}).get(key)
+            if future is None:
+                future = self._enqueue(scope, key)
+            memo[key] = future
+        return await asyncio.shield(future)
+
+    def _enqueue(self, scope: Hashable, key: Hashable) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        pending = self._pending.get(scope)
+        if pending is None:
+            pending = self._pending[scope] = {}
+            # Dispatch in the first caller's context, so the batch runs as that scope
+            context = copy_context()
+            if self.batch_delay > 0:
+                loop.call_later(self.batch_delay, self._dispatch, scope, context=context)
+            else:
+                loop.call_soon(self._dispatch, scope, context=context)
+        future = loop.create_future()
+        pending[key] = future
+        return future
+
+    def _dispatch(self, scope: Hashable) -> None:
+        pending = self._pending.pop(scope, {})
+        keys = list(pending)
+        for start in range(0, len(keys), self.max_batch_size):
+            chunk = {key: pending[key] for key in keys[start:start + self.max_batch_size]}
+            asyncio.ensure_future(self._run_batch(chunk))
+
+    async def _run_batch(self, futures: Dict[Hashable, asyncio.Future]) -> None:
+        self.batches += 1
+        self.loaded += len(futures)
+        try:
+            results = await self.batch_fn(list(futures))
+        except Exception as e:
+            for future in futures.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for key, future in futures.items():
+            if future.done():
+                continue
+            if key not in results:
+                future.set_exception(KeyError(key))
+            elif isinstance(results[key], BaseException):
+                future.set_exception(results[key])
+            else:
+                future.set_result(results[key])
@@ -0,0 +1,104 @@
+import math
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from config import settings
+
+# Tokens the chat format spends on each message besides its content
+MESSAGE_OVERHEAD = 4
+# Characters kept from each message folded into the rolling summary
+SUMMARY_EXCERPT_LENGTH = 160
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate how many tokens a text costs without running a tokenizer.
+
+    Latin text averages about four characters per token, while Arabic script
+    is split much more finely, at about two characters per token.
+    """
+    ascii_chars = sum(1 for char in text if ord(char) < 128)
+    return math.ceil(ascii_chars / 4 + (len(text) - ascii_chars) / 2)
+
+
+def estimate_message_tokens(message: Dict[str, str]) -> int:
+    return MESSAGE_OVERHEAD + estimate_tokens(message.get("content") or "")
+
+
+def get_context_budget(model: str) -> int:
+    """
+    Prompt token budget for a model, falling back to the default budget.
+    """
+    return settings.LLM_CONTEXT_BUDGETS.get(model, settings.LLM_CONTEXT_BUDGET)
+
+
+@dataclass
+class ConversationWindow:
+    """
+    Prompt built from a conversation.
+
+    Attributes:
+        messages: Messages to send, system message first and the new user message last
+        dropped: History messages that did not fit, oldest first
+        tokens: Estimated prompt size
+    """
+    messages: List[Dict[str, str]]
+    dropped: List[Dict[str, str]] = field(default_factory=list)
+    tokens: int = 0
+
+
+def build_window(system_message: Dict[str, str], history: List[Dict[str, str]],
+                 user_message: Dict[str, str], budget: int,
+                 summary: Optional[str] = None) -> ConversationWindow:
+    """
+    Fit as much recent history as the token budget allows between the system
+    message (plus the summary of older turns) and the new user message.
+
+    The system message, the summary and the user message are always sent,
+    even if they alone exceed the budget.
+    """
+    head = [system_message]
+    if summary:
+        head.append({"role": "system", "content": f"ملخص المحادثة السابقة:\n{summary}"})
+    tokens = sum(map(estimate_message_tokens, head)) + estimate_message_tokens(user_message)
+
+    kept: List[Dict[str, str]] = []
+    index = len(history)
+    while index > 0:
+        cost = estimate_message_tokens(history[index - 1])
+        if tokens + cost > budget:
+            break
+        tokens += cost
+        index -= 1
+        kept.append(history[index])
+    kept.reverse()
+
+    # Never open the window on an assistant reply whose question was left out
+    while kept and kept[0]["role"] == "assistant":
+        tokens -= estimate_message_tokens(kept.pop(0))
+        index += 1
+
+    messages = [*head, *({"role": m["role"], "content": m["content"]} for m in kept), user_message]
+    return ConversationWindow(messages=messages, dropped=history[:index], tokens=tokens)
+
+
+def summarize(previous: Optional[str], messages: List[Dict[str, str]],
+              max_tokens: int = None) -> str:
+    """
+    Fold messages into a rolling extractive summary.
+
+    Each message contributes a short excerpt; once the summary exceeds
+    ``max_tokens`` its oldest lines are dropped.
+    """
+    max_tokens = settings.CONVERSATION_SUMMARY_MAX_TOKENS if max_tokens is None else max_tokens
+    lines = previous.splitlines() if previous else []
+    for message in messages:
+        content = " ".join((message.get("content") or "").split())
+        if len(content) > SUMMARY_EXCERPT_LENGTH:
+            content = content[:SUMMARY_EXCERPT_LENGTH].rstrip() + "…"
+        if content:
+            lines.append(f"- {message['role']}: {content}")
+
+    while len(lines) > 1 and estimate_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return "\n".join(lines)
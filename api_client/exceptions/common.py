@@ -5,9 +5,11 @@ class ApiClientError(Exception):
     :param:
         message (str): Description of the error.
         response_errors (Any, optional): Additional error details from the API response.
+        status (int, optional): HTTP status of the failed response, if one was received.
     """
 
-    def __init__(self, message: str, response_errors=None):
+    def __init__(self, message: str, response_errors=None, status: int = None):
         super().__init__(message)
         # Store additional error details from the API response, if any
         self.response_errors = response_errors
+        self.status = status
@@ -0,0 +1,110 @@
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import time
+from typing import Any, Dict, Optional
+
+from config import settings
+
+_HS_ALGORITHMS = {
+    "HS256": hashlib.sha256,
+    "HS384": hashlib.sha384,
+    "HS512": hashlib.sha512,
+}
+
+
+def _b64decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+def _split(token: str):
+    """
+    Split a JWT into its segments and decode its header and claims.
+    Raises ValueError for anything that isn't a well-formed JWT.
+    """
+    try:
+        header_segment, payload_segment, signature_segment = token.split(".")
+        header = json.loads(_b64decode(header_segment))
+        claims = json.loads(_b64decode(payload_segment))
+    except (ValueError, binascii.Error) as e:
+        raise ValueError("Malformed token") from e
+    if not isinstance(header, dict) or not isinstance(claims, dict):
+        raise ValueError("Malformed token")
+    return header_segment, payload_segment, signature_segment, header, claims
+
+
+def decode_token(token: Optional[str], verify: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    Decode the claims of a JWT issued by the backend, without a network call.
+
+    The signature is checked against ``JWT_SIGNING_KEY`` when one is configured.
+    Without a key, claims are only returned when ``verify`` is False, so
+    callers can read hints such as the expiry but never trust an unverified
+    token for authorization decisions.
+
+    Args:
+        token: Encoded JWT
+        verify: Require a valid signature
+
+    Returns:
+        The token's claims, or None if the token is malformed, unverifiable
+        or expired.
+    """
+    if not token:
+        return None
+    try:
+        header_segment, payload_segment, signature_segment, header, claims = _split(token)
+    except ValueError:
+        return None
+
+    if verify:
+        digest = _HS_ALGORITHMS.get(header.get("alg"))
+        if not settings.JWT_SIGNING_KEY or digest is None:
+            return None
+        expected = hmac.new(
+            settings.JWT_SIGNING_KEY.encode(), f"{header_segment}.{payload_segment}".encode(), digest
+        ).digest()
+        try:
+            signature = _b64decode(signature_segment)
+        except (ValueError, binascii.Error):
+            return None
+        if not hmac.compare_digest(expected, signature):
+            return None
+
+    expires_at = claims.get("exp")
+    if isinstance(expires_at, (int, float)) and expires_at <= time.time() - settings.JWT_LEEWAY:
+        return None
+    return claims
+
+
+def get_expiry(token: Optional[str]) -> Optional[float]:
+    """
+    Get the expiry timestamp encoded in a token, if it has one.
+    The signature is not checked: the expiry only bounds how long we keep the token.
+    """
+    if not token:
+        return None
+    try:
+        expires_at = _split(token)[4].get("exp")
+    except ValueError:
+        return None
+    return float(expires_at) if isinstance(expires_at, (int, float)) else None
+
+
+def get_staff_claim(token: Optional[str]) -> Optional[bool]:
+    """
+    Get the staff flag from a verified token, or None if it can't be trusted or isn't there.
+    """
+    claims = decode_token(token)
+    if claims is None or settings.JWT_STAFF_CLAIM not in claims:
+        return None
+    return bool(claims[settings.JWT_STAFF_CLAIM])
+
+
+def is_signature_verification_enabled() -> bool:
+    """
+    Whether tokens can be verified locally.
+    """
+    return bool(settings.JWT_SIGNING_KEY)
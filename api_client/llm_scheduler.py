@@ -0,0 +1,189 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Tuple
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LlmBusyError(Exception):
+    """
+    Too many requests are waiting for the AI assistant; the user should try again later.
+    """
+
+
+class SupersededError(Exception):
+    """
+    A newer message from the same user was merged with this one and is answered instead.
+    """
+
+
+@dataclass
+class _Job:
+    user_id: Hashable
+    texts: List[str]
+    func: Callable[[str], Awaitable[Any]]
+    future: asyncio.Future
+
+
+class LlmScheduler:
+    """
+    Bounds and orders calls to the AI assistant.
+
+    At most ``max_concurrency`` calls run at once, and at most one per user.
+    Each user has at most one waiting job: a message that arrives while the
+    user's previous one is still waiting is merged into it, and the earlier
+    caller gets SupersededError, so the merged job is answered once, to the
+    latest message. Waiting jobs are started in the order their users joined
+    the queue, which takes turns between users however many messages each
+    one sends. When ``max_queue_depth`` jobs are already waiting, or a job
+    waits longer than ``max_wait`` seconds, the caller gets LlmBusyError
+    instead of a reply that would arrive too late.
+
+    Jobs run in their own tasks, so a caller that gives up doesn't stop a
+    job that has already started. A caller may instead preempt the user's
+    running job: it is cancelled and its text is merged into the new one.
+
+    Attributes:
+        executed: Number of jobs started
+        merged: Number of messages merged into a waiting job
+        preempted: Number of running jobs cancelled by a newer message
+        shed: Number of messages turned away as busy
+    """
+
+    def __init__(self, max_concurrency: int = None, max_queue_depth: int = None, max_wait: float = None):
+        self._max_concurrency = max_concurrency or settings.LLM_MAX_CONCURRENCY
+        self._max_queue_depth = max_queue_depth or settings.LLM_QUEUE_MAX_DEPTH
+        self._max_wait = max_wait or settings.LLM_QUEUE_MAX_WAIT
+        self._queue: "OrderedDict[Hashable, _Job]" = OrderedDict()
+        self._running: Dict[Hashable, Tuple[_Job, asyncio.Task]] = {}
+        self.executed = 0
+        self.merged = 0
+        self.preempted = 0
+        self.shed = 0
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+    @property
+    def running(self) -> int:
+        return len(self._running)
+
+    async def submit(self, user_id: Hashable, text: str, func: Callable[[str], Awaitable[Any]],
+                     preempt: bool = False) -> Any:
+        """
+        Run ``func`` with the user's message once the user's turn comes.
+
+        Args:
+            user_id: Key of the user the message belongs to
+            text: Message text
+            func: Produces the reply to the text, merged with the user's earlier waiting messages
+            preempt: Cancel the user's running job and answer its text along with this one
+
+        Raises:
+            SupersededError: If a newer message from the user took this one over
+            LlmBusyError: If the queue is full or the wait is too long
+        """
+        texts = [text]
+        if preempt and user_id in self._running:
+            running_job, task = self._running[user_id]
+            if self._supersede(running_job):
+                texts = running_job.texts + texts
+                task.cancel()
+                self.preempted += 1
+
+        job = self._queue.get(user_id)
+        if job is not None:
+            self._supersede(job)
+            job.texts = [*texts[:-1], *job.texts, text]
+            job.func = func
+            job.future = asyncio.get_running_loop().create_future()
+            self.merged += 1
+        elif len(self._queue) >= self._max_queue_depth:
+            self.shed += 1
+            logger.warning(f"Shedding AI request: {len(self._queue)} requests are already waiting")
+            raise LlmBusyError()
+        else:
+            job = _Job(user_id, texts, func, asyncio.get_running_loop().create_future())
+            self._queue[user_id] = job
+        future = job.future
+        self._dispatch()
+
+        try:
+            await asyncio.wait([future], timeout=self._max_wait)
+        except asyncio.CancelledError:
+            self._withdraw(job, future)
+            raise
+        if not future.done():
+            if self._withdraw(job, future, LlmBusyError()):
+                self.shed += 1
+                logger.warning(f"Shedding AI request after waiting {self._max_wait}s")
+        return await future
+
+    @staticmethod
+    def _supersede(job: _Job) -> bool:
+        """
+        Tell a job's caller that a newer message took it over.
+        """
+        if job.future.done():
+            return False
+        job.future.set_exception(SupersededError())
+        job.future.exception()
+        return True
+
+    def _withdraw(self, job: _Job, future: asyncio.Future, error: Exception = None) -> bool:
+        """
+        Take a job that hasn't started out of the queue, failing its caller
+        with ``error``, or cancelling it without one.
+        """
+        if self._queue.get(job.user_id) is not job or job.future is not future:
+            return False
+        del self._queue[job.user_id]
+        if error is None:
+            future.cancel()
+        else:
+            future.set_exception(error)
+            future.exception()
+        return True
+
+    def _dispatch(self) -> None:
+        """
+        Start waiting jobs while there is capacity, skipping users with a running job.
+        """
+        while len(self._running) < self._max_concurrency:
+            job = next((job for user_id, job in self._queue.items() if user_id not in self._running), None)
+            if job is None:
+                return
+            del self._queue[job.user_id]
+            self.executed += 1
+            task = asyncio.create_task(self._run(job))
+            self._running[job.user_id] = (job, task)
+            task.add_done_callback(lambda finished, finished_job=job: self._finish(finished_job, finished))
+
+    async def _run(self, job: _Job) -> None:
+        try:
+            result = await job.func("\n".join(job.texts))
+        except Exception as e:
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            if not job.future.done():
+                job.future.set_result(result)
+
+    def _finish(self, job: _Job, task: asyncio.Task) -> None:
+        """
+        Free the user's slot once a job's task is done, even if it was cancelled before it started.
+        """
+        if not job.future.done():
+            job.future.cancel()
+        if self._running.get(job.user_id, (None, None))[1] is task:
+            del self._running[job.user_id]
+        self._dispatch()
+
+
+# Shared by every handler that calls the AI assistant
+llm_scheduler = LlmScheduler()
@@ -1,135 +1,486 @@
+import asyncio
 import aiohttp
 import logging
-from typing import List, Dict, Any, Optional
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, AsyncIterator, Awaitable, Callable, Tuple, TypeVar
 import json
+import time
 
+from api_client.conversation_window import build_window, estimate_tokens, get_context_budget, summarize
+from api_client.sessions import SessionRegistry, Upstream
 from config import settings
+from redis_client.answer_cache import AnswerCache
 from redis_client.conversation_history import ConversationHistoryManager
+from redis_client.model_health import ModelHealthTracker
+from redis_client.token_usage import TokenUsage
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+
+# Default system message for the customer support AI
+SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": "أنت مساعد دعم عملاء مفيد لبوت Luqta eShop على تيليجرام. يتم إجراء جميع التفاعلات بشكل أساسي من خلال الأوامر. قدم ردودًا موجزة ودقيقة باللغة العربية وباللهجة الغزاوية على استفسارات العملاء. فقط عندما يُسأل تحديدًا عن تسجيل الدخول أو إنشاء حساب، اشرح عملية التسجيل. فقط عندما يُسأل عن الأوامر المتاحة أو كيفية استخدام النظام، اذكر أنه: (1) لتسجيل الدخول، استخدم الأمر /login؛ (2) للتسجيل، استخدم الأمر /register؛ (3) للتعرف على الميزات المتاحة، استخدم الأمر /help. لاحظ أن جميع الأوامر يمكن استخدامها أيضًا بترجمتها العربية. إذا أدخل المستخدم نصًا يبدو كأمر ولكنه غير معروف (يبدأ بـ / ولكنه لا يتطابق مع الأوامر المعروفة)، أخبرهم أن الأمر قد يكون مهجئًا بشكل خاطئ واقترح الأمر المطابق الأقرب. لا تذكر هذه الأوامر استباقيًا في كل رد. إذا لم تكن تعرف الإجابة على سؤال ما، فقط اعترف بذلك ولا تحاول تخمين إجابة أو تقديم معلومات غير مؤكدة."
+}
+
+# Health bookkeeping still running after its reply was sent
+_background_tasks = set()
+
+CHAT_COMPLETIONS_URL = "https://openrouter.ai/api/v1/chat/completions"
+
+CONFIGURATION_ERROR_REPLY = "عذراً، هناك مشكلة في إعداد المساعد. الرجاء الاتصال بالدعم الفني."
+QUOTA_EXCEEDED_REPLY = "عذراً، لقد استهلكت الحد المسموح من المساعد لهذه الفترة. الرجاء المحاولة مرة أخرى لاحقاً."
+CONNECTION_ERROR_REPLY = "عذراً، حدث خطأ في الاتصال بالخادم. الرجاء المحاولة مرة أخرى لاحقاً."
+
+
+@dataclass
+class ConversationPrompt:
+    """Everything needed to build the prompt of one AI turn, whichever model answers it"""
+    user_message: Dict[str, str]
+    system_message: Dict[str, str] = field(default_factory=lambda: SYSTEM_MESSAGE)
+    history: List[Dict[str, Any]] = field(default_factory=list)
+    summary: Optional[str] = None
+    user_id: Optional[int] = None
+    estimated_tokens: Dict[str, int] = field(default_factory=dict)
+
+    def messages_for(self, model: str) -> List[Dict[str, str]]:
+        """Build the messages to send, kept within the model's token budget"""
+        window = build_window(
+            self.system_message, self.history, self.user_message, get_context_budget(model), self.summary
+        )
+        self.estimated_tokens[model] = window.tokens
+        logger.debug(f"Sending ~{window.tokens} tokens to OpenRouter: {json.dumps(window.messages, ensure_ascii=False)}")
+        return window.messages
+
+    @property
+    def is_cacheable(self) -> bool:
+        """Whether the answer depends on nothing but the question, as on the first turn of a conversation"""
+        return settings.LLM_ANSWER_CACHE and not self.history and not self.summary
+
+    async def get_cached_reply(self) -> Optional[str]:
+        """Look up a stored answer to the same question, asked without context"""
+        if not self.is_cacheable:
+            return None
+        return await AnswerCache.get(self.user_message["content"], self.system_message["content"])
+
+    async def save_reply(self, assistant_message: str, cache: bool = True) -> None:
+        """Save the exchange to history in one atomic append, and the answer to the answer cache"""
+        if cache and self.is_cacheable:
+            await AnswerCache.set(self.user_message["content"], self.system_message["content"], assistant_message)
+        if self.user_id is not None:
+            await ConversationHistoryManager().add_messages(
+                self.user_id, self.user_message, {"role": "assistant", "content": assistant_message}
+            )
+
+    async def is_over_quota(self) -> bool:
+        """Whether the user has used up a token quota, checked before any model is called"""
+        if self.user_id is None:
+            return False
+        exceeded = await TokenUsage.get_exceeded_quota(self.user_id)
+        if exceeded is not None:
+            logger.info(f"User {self.user_id} is over the token quota for {exceeded.window}: "
+                        f"{exceeded.total}/{exceeded.quota}")
+        return exceeded is not None
+
+    def record_usage(self, model: str, usage: Optional[Dict[str, Any]], completion: str) -> None:
+        """Account the tokens of a model call to the user, estimating them if OpenRouter didn't report usage"""
+        if self.user_id is None:
+            return
+        usage = usage or {}
+        prompt_tokens = usage.get("prompt_tokens")
+        completion_tokens = usage.get("completion_tokens")
+        if prompt_tokens is None:
+            prompt_tokens = self.estimated_tokens.get(model, 0)
+        if completion_tokens is None:
+            completion_tokens = estimate_tokens(completion)
+        _in_background(TokenUsage.record(self.user_id, model, int(prompt_tokens), int(completion_tokens)))
+
+
+async def _prepare_prompt(user_message: str, user_id: Optional[int]) -> ConversationPrompt:
+    """Load the user's conversation, fetched once per turn, and fold what no longer fits into the summary"""
+    prompt = ConversationPrompt(user_message={"role": "user", "content": user_message}, user_id=user_id)
+    if user_id is None:
+        return prompt
 
-async def generate_customer_support_reply(user_message: str, user_id: int = None) -> str:
-    """Get AI response from OpenRouter API using aiohttp
+    history_manager = ConversationHistoryManager()
+    stored_system_message, stored_summary, history = await history_manager.get_conversation(user_id)
+    prompt.system_message = stored_system_message or SYSTEM_MESSAGE
+
+    # Messages already folded into the summary are not sent again; messages
+    # stored before they were stamped are kept until they are folded
+    through = 0
+    if stored_summary:
+        prompt.summary, through = stored_summary.get("content"), stored_summary.get("through", 0)
+    prompt.history = [message for message in history if message.get("ts", through + 1) > through]
+
+    # Fold turns that no longer fit the preferred model's budget into the rolling summary,
+    # and out of the stored history
+    window = build_window(
+        prompt.system_message, prompt.history, prompt.user_message,
+        get_context_budget(settings.LLM_MODELS[0]), prompt.summary
+    )
+    if window.dropped:
+        prompt.summary = summarize(prompt.summary, window.dropped)
+        prompt.history = prompt.history[len(window.dropped):]
+        through = max(message.get("ts", 0) for message in window.dropped) or through
+        await history_manager.set_summary(user_id, prompt.summary, through, len(history) - len(prompt.history))
+    return prompt
+
+
+async def prepare_customer_support_reply(user_message: str,
+                                         user_id: int = None) -> Tuple[ConversationPrompt, Optional[str]]:
+    """Load a turn's prompt and answer it without a model when possible
+
+    Cached answers and quota rejections need no model call, so callers that
+    limit model calls can run this first and queue only the rest.
 
-    Args:
-        user_message: The message from the user
-        user_id: Telegram user ID to maintain conversation history
+    Returns:
+        The prompt, and the reply if it came from the answer cache or the
+        user is over quota. Otherwise the reply is None and the prompt can
+        be passed to generate_customer_support_reply or stream_customer_support_reply.
     """
-    # Default system message for the customer support AI
-    system_message = {
-        "role": "system",
-        "content": "أنت مساعد دعم عملاء مفيد لبوت Luqta eShop على تيليجرام. يتم إجراء جميع التفاعلات بشكل أساسي من خلال الأوامر. قدم ردودًا موجزة ودقيقة باللغة العربية وباللهجة الغزاوية على استفسارات العملاء. فقط عندما يُسأل تحديدًا عن تسجيل الدخول أو إنشاء حساب، اشرح عملية التسجيل. فقط عندما يُسأل عن الأوامر المتاحة أو كيفية استخدام النظام، اذكر أنه: (1) لتسجيل الدخول، استخدم الأمر /login؛ (2) للتسجيل، استخدم الأمر /register؛ (3) للتعرف على الميزات المتاحة، استخدم الأمر /help. لاحظ أن جميع الأوامر يمكن استخدامها أيضًا بترجمتها العربية. إذا أدخل المستخدم نصًا يبدو كأمر ولكنه غير معروف (يبدأ بـ / ولكنه لا يتطابق مع الأوامر المعروفة)، أخبرهم أن الأمر قد يكون مهجئًا بشكل خاطئ واقترح الأمر المطابق الأقرب. لا تذكر هذه الأوامر استباقيًا في كل رد. إذا لم تكن تعرف الإجابة على سؤال ما، فقط اعترف بذلك ولا تحاول تخمين إجابة أو تقديم معلومات غير مؤكدة."
-    }
-
-    # Create message data with current user message
-    user_message_data = {"role": "user", "content": user_message}
-
-    # Initialize messages list
-    messages = [system_message]
+    prompt = await _prepare_prompt(user_message, user_id)
 
-    # If user_id is provided, use conversation history
-    if user_id is not None:
-        history_manager = ConversationHistoryManager()
+    cached_reply = await prompt.get_cached_reply()
+    if cached_reply is not None:
+        logger.info("Answered from the answer cache")
+        await prompt.save_reply(cached_reply, cache=False)
+        return prompt, cached_reply
 
-        # Get existing conversation history
-        history = await history_manager.get_conversation_history(user_id)
+    if await prompt.is_over_quota():
+        return prompt, QUOTA_EXCEEDED_REPLY
+    return prompt, None
 
-        # If history exists, use it instead of default system message
-        if history:
-            messages = history
 
-        # Add the current user message to history
-        await history_manager.add_message(user_id, user_message_data)
-
-    # Add current user message to the messages list for this request
-    if not messages or messages[-1] != user_message_data:
-        messages.append(user_message_data)
-
-    # Debug info about API key
+def _get_api_key() -> Optional[str]:
     api_key = settings.OPENROUTER_API_KEY
     if not api_key:
         logger.error("OPENROUTER_API_KEY is not set in environment variables")
-        return "عذراً، هناك مشكلة في إعداد المساعد. الرجاء الاتصال بالدعم الفني."
+        return None
 
     # Show just the first and last few characters of the API key for security
     masked_key = api_key[:4] + "*" * (len(api_key) - 8) + api_key[-4:] if len(api_key) > 8 else "****"
     logger.debug(f"Using OpenRouter API key: {masked_key}")
+    return api_key
+
+
+def _get_headers(api_key: str) -> Dict[str, str]:
+    return {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+        "HTTP-Referer": "https://luqta.ps",
+        "X-Title": "Luqta eShop",
+    }
+
+
+class _ModelFailure(Exception):
+    """A model could not answer; the hedge moves on to the next one"""
+
 
-    logger.debug(f"Sending messages to OpenRouter: {json.dumps(messages, ensure_ascii=False)}")
+def _in_background(coroutine: Awaitable[None]) -> None:
+    """Run bookkeeping without holding up the reply"""
+    task = asyncio.create_task(coroutine)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
 
-    # Models to try in order of preference
-    models = [
-        "deepseek/deepseek-r1:free",  # First choice
-        "openai/gpt-3.5-turbo",       # Fallback option
-        "meta/llama-3-instruct:1:latest"  # Final fallback
-    ]
 
+async def _tracked(attempt: Callable[[str], Awaitable[T]], model: str, hedge_delay: float) -> T:
+    """Run an attempt, recording its outcome and latency in the model's health"""
+    started = time.monotonic()
+    try:
+        result = await attempt(model)
+    except asyncio.CancelledError:
+        elapsed = time.monotonic() - started
+        if elapsed >= hedge_delay:
+            _in_background(ModelHealthTracker.record_latency(model, elapsed))
+        raise
+    except Exception as e:
+        _in_background(ModelHealthTracker.record_failure(model, str(e)))
+        raise
+    _in_background(ModelHealthTracker.record_success(model, time.monotonic() - started))
+    return result
+
+
+async def _hedge(attempt: Callable[[str], Awaitable[T]],
+                 discard: Callable[[T], Awaitable[None]] = None,
+                 hedge_delay: float = None) -> T:
+    """Race models for the first good answer
+
+    Models are taken from ``LLM_MODELS`` as ranked by their health. The
+    first model starts right away; each next one starts as soon as the
+    previous attempt fails, or when no answer has arrived within
+    ``hedge_delay``. The first successful attempt wins and the rest are
+    cancelled. The whole race is capped at ``LLM_DEADLINE``.
+
+    Args:
+        attempt: Asks one model, raising on failure
+        discard: Releases the result of an attempt that succeeded after the winner
+        hedge_delay: Seconds to wait for an attempt before starting the next one,
+            ``LLM_HEDGE_DELAY`` by default
+
+    Raises:
+        _ModelFailure: If every model failed or the deadline passed
+    """
+    hedge_delay = settings.LLM_HEDGE_DELAY if hedge_delay is None else hedge_delay
+    models = await ModelHealthTracker.rank(settings.LLM_MODELS)
+    pending = set()
+    remaining = iter(models)
     last_error = None
 
-    # Try each model until one works
-    for model in models:
+    def launch() -> bool:
+        model = next(remaining, None)
+        if model is None:
+            return False
+        logger.info(f"Attempting to use model: {model}")
+        pending.add(asyncio.create_task(_tracked(attempt, model, hedge_delay), name=model))
+        return True
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.LLM_DEADLINE
+    launch()
+    try:
+        while pending:
+            timeout = min(hedge_delay, deadline - loop.time())
+            if timeout <= 0:
+                for task in pending:
+                    _in_background(ModelHealthTracker.record_failure(task.get_name(), "Timed out"))
+                raise _ModelFailure(f"No answer within {settings.LLM_DEADLINE}s. Last error: {last_error or 'none'}")
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                # The running attempts are slow; hedge with the next model
+                launch()
+                continue
+
+            winner = None
+            failed = 0
+            for task in done:
+                pending.discard(task)
+                error = task.exception()
+                if error is not None:
+                    if not isinstance(error, _ModelFailure):
+                        logger.error(f"Unexpected error with {task.get_name()}: {str(error)}", exc_info=error)
+                    last_error = str(error)
+                    failed += 1
+                elif winner is None:
+                    winner = task
+                elif discard is not None:
+                    await discard(task.result())
+            if winner is not None:
+                if winner.get_name() != settings.LLM_MODELS[0]:
+                    logger.info(f"Successfully used fallback model: {winner.get_name()}")
+                return winner.result()
+            # Replace the failed attempts only once no answer came in with them
+            for _ in range(failed):
+                launch()
+        raise _ModelFailure(f"All models failed. Last error: {last_error}")
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            # Let the losers release their connections before returning
+            await asyncio.wait(pending)
+            for task in pending:
+                if not task.cancelled() and task.exception() is None and discard is not None:
+                    await discard(task.result())
+
+
+async def generate_customer_support_reply(user_message: str, user_id: int = None,
+                                          prompt: ConversationPrompt = None) -> str:
+    """Get AI response from OpenRouter API using aiohttp
+
+    Models are hedged: a slow or failing model doesn't hold up the next one.
+
+    Args:
+        user_message: The message from the user
+        user_id: Telegram user ID to maintain conversation history
+        prompt: The turn's prompt from prepare_customer_support_reply, if it was already prepared
+    """
+    if prompt is None:
+        prompt, reply = await prepare_customer_support_reply(user_message, user_id)
+        if reply is not None:
+            return reply
+
+    api_key = _get_api_key()
+    if not api_key:
+        return CONFIGURATION_ERROR_REPLY
+
+    async def attempt(model: str) -> Tuple[str, str, Optional[Dict[str, Any]]]:
         try:
-            logger.info(f"Attempting to use model: {model}")
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    url="https://openrouter.ai/api/v1/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {api_key}",
-                        "Content-Type": "application/json",
-                        "HTTP-Referer": "https://luqta.ps",
-                        "X-Title": "Luqta eShop",
-                    },
-                    json={
-                        "model": model,
-                        "messages": messages,
-                        "temperature": 0.7,
-                        "max_tokens": 500,
-                    },
-                    timeout=30
-                ) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        logger.error(f"OpenRouter API error with {model} (status {response.status}): {error_text}")
-                        last_error = f"API Error {response.status}: {error_text}"
-                        continue  # Try next model
-
-                    response_data = await response.json()
-                    logger.debug(f"OpenRouter response from {model}: {json.dumps(response_data, ensure_ascii=False)}")
-
-                    try:
-                        assistant_message = response_data["choices"][0]["message"]["content"]
-
-                        # If model worked but wasn't first choice, log that info
-                        if model != models[0]:
-                            logger.info(f"Successfully used fallback model: {model}")
-
-                        # If user_id is provided, save the assistant's reply to history
-                        if user_id is not None:
-                            await history_manager.add_message(
-                                user_id, {"role": "assistant", "content": assistant_message}
-                            )
-
-                        return assistant_message
-                    except (KeyError, IndexError) as e:
-                        # Log the exact structure that caused the error
-                        logger.error(f"Error extracting message from {model} response: {str(e)}. Response data: {json.dumps(response_data, ensure_ascii=False)}")
-                        last_error = f"Model {model} returned malformed response: {str(e)}"
-                        continue  # Try next model
-
-        except aiohttp.ClientError as e:
+            session = await SessionRegistry.get_session(Upstream.OPENROUTER)
+            async with session.post(
+                url=CHAT_COMPLETIONS_URL,
+                headers=_get_headers(api_key),
+                json={
+                    "model": model,
+                    "messages": prompt.messages_for(model),
+                    "temperature": 0.7,
+                    "max_tokens": 500,
+                    "usage": {"include": True},
+                },
+                timeout=settings.LLM_DEADLINE
+            ) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    logger.error(f"OpenRouter API error with {model} (status {response.status}): {error_text}")
+                    raise _ModelFailure(f"API Error {response.status}: {error_text}")
+
+                response_data = await response.json()
+                logger.debug(f"OpenRouter response from {model}: {json.dumps(response_data, ensure_ascii=False)}")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
             logger.error(f"Network error with OpenRouter API using {model}: {str(e)}")
-            last_error = f"Network error with {model}: {str(e)}"
-            continue  # Try next model
-        except Exception as e:
-            logger.exception(f"Unexpected error with {model}: {str(e)}")
-            last_error = f"Unexpected error with {model}: {str(e)}"
-            continue  # Try next model
+            raise _ModelFailure(f"Network error with {model}: {str(e)}") from e
+
+        try:
+            return model, response_data["choices"][0]["message"]["content"], response_data.get("usage")
+        except (KeyError, IndexError, TypeError) as e:
+            # Log the exact structure that caused the error
+            logger.error(f"Error extracting message from {model} response: {str(e)}. Response data: {json.dumps(response_data, ensure_ascii=False)}")
+            raise _ModelFailure(f"Model {model} returned malformed response: {str(e)}") from e
+
+    try:
+        # A whole completion takes far longer than a first streamed token,
+        # so wait longer before paying for a second request
+        model, assistant_message, usage = await _hedge(attempt, hedge_delay=settings.LLM_COMPLETION_HEDGE_DELAY)
+    except _ModelFailure as e:
+        logger.error(str(e))
+        return CONNECTION_ERROR_REPLY
+
+    prompt.record_usage(model, usage, assistant_message)
+    await prompt.save_reply(assistant_message)
+    return assistant_message
+
+
+async def _iter_stream_deltas(response: aiohttp.ClientResponse, usage: Dict[str, Any]) -> AsyncIterator[str]:
+    """Yield the content deltas of an OpenRouter server-sent event stream, filling ``usage`` once it's reported"""
+    async for raw_line in response.content:
+        line = raw_line.decode("utf-8").strip()
+        # Blank lines separate events; lines starting with ':' are keep-alive comments
+        if not line.startswith("data:"):
+            continue
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return
+        chunk = json.loads(data)
+        if "error" in chunk:
+            raise ValueError(f"Stream error: {chunk['error']}")
+        if chunk.get("usage"):
+            usage.update(chunk["usage"])
+        choices = chunk.get("choices") or []
+        delta = (choices[0].get("delta") or {}).get("content") if choices else None
+        if delta:
+            yield delta
+
+
+@dataclass
+class _OpenStream:
+    """A model's stream that has produced its first token"""
+    model: str
+    response: aiohttp.ClientResponse
+    deltas: AsyncIterator[str]
+    first: str
+    usage: Dict[str, Any]
+
+    async def close(self) -> None:
+        await self.deltas.aclose()
+        self.response.release()
+
+
+async def stream_customer_support_reply(user_message: str, user_id: int = None,
+                                        on_text: Callable[[str], Awaitable[None]] = None,
+                                        prompt: ConversationPrompt = None) -> str:
+    """Stream an AI response from OpenRouter, reporting the text generated so far as it arrives
+
+    Models are hedged on their first token: the first model to start
+    answering streams the reply and the others are cancelled. If the stream
+    breaks afterwards, the partial reply is returned but not saved to history.
+
+    Args:
+        user_message: The message from the user
+        user_id: Telegram user ID to maintain conversation history
+        on_text: Called with the full text generated so far after every chunk
+        prompt: The turn's prompt from prepare_customer_support_reply, if it was already prepared
 
-    # If we get here, all models failed
-    logger.error(f"All models failed. Last error: {last_error}")
-    return "عذراً، حدث خطأ في الاتصال بالخادم. الرجاء المحاولة مرة أخرى لاحقاً."
+    Returns:
+        The complete reply, or an error message if no model could answer.
+    """
+    if prompt is None:
+        prompt, reply = await prepare_customer_support_reply(user_message, user_id)
+        if reply is not None:
+            return reply
+
+    api_key = _get_api_key()
+    if not api_key:
+        return CONFIGURATION_ERROR_REPLY
+
+    async def attempt(model: str) -> _OpenStream:
+        session = await SessionRegistry.get_session(Upstream.OPENROUTER)
+        response = None
+        try:
+            response = await session.post(
+                url=CHAT_COMPLETIONS_URL,
+                headers=_get_headers(api_key),
+                json={
+                    "model": model,
+                    "messages": prompt.messages_for(model),
+                    "temperature": 0.7,
+                    "max_tokens": 500,
+                    "stream": True,
+                    "usage": {"include": True},
+                },
+                # Bound the wait for each chunk, not the whole generation
+                timeout=aiohttp.ClientTimeout(sock_connect=10, sock_read=30)
+            )
+            if response.status != 200:
+                error_text = await response.text()
+                logger.error(f"OpenRouter API error with {model} (status {response.status}): {error_text}")
+                raise _ModelFailure(f"API Error {response.status}: {error_text}")
+
+            usage = {}
+            deltas = _iter_stream_deltas(response, usage)
+            try:
+                first = await anext(deltas)
+            except StopAsyncIteration:
+                raise _ModelFailure(f"Model {model} returned an empty response")
+            return _OpenStream(model, response, deltas, first, usage)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            logger.error(f"Streaming error with OpenRouter API using {model}: {str(e)}")
+            if response is not None:
+                response.release()
+            raise _ModelFailure(f"Streaming error with {model}: {str(e)}") from e
+        except BaseException:
+            # Failed or lost the race: give the connection back
+            if response is not None:
+                response.release()
+            raise
+
+    try:
+        stream = await _hedge(attempt, discard=_OpenStream.close)
+    except _ModelFailure as e:
+        logger.error(str(e))
+        return CONNECTION_ERROR_REPLY
+
+    text = stream.first
+    try:
+        if on_text is not None:
+            await on_text(text)
+        async for delta in stream.deltas:
+            text += delta
+            if on_text is not None:
+                await on_text(text)
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+        # Part of the reply was already shown to the user; don't restart with another model
+        logger.error(f"Stream from {stream.model} broke after {len(text)} characters: {str(e)}")
+        return text
+    finally:
+        # Usage is only reported at the end; estimate it for a stream that broke or was cancelled
+        prompt.record_usage(stream.model, stream.usage, text)
+        await stream.close()
+
+    await prompt.save_reply(text)
+    return text
 
 
 async def clear_user_conversation(user_id: int) -> None:
@@ -149,40 +500,40 @@ async def test_openrouter_connection() -> Dict[str, Any]:
         return {"status": "error", "message": "API key not configured"}
 
     try:
-        async with aiohttp.ClientSession() as session:
-            # First test a basic models list request
-            async with session.get(
-                url="https://openrouter.ai/api/v1/models",
-                headers={
-                    "Authorization": f"Bearer {api_key}",
-                    "Content-Type": "application/json",
-                }
-            ) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    return {
-                        "status": "error",
-                        "code": response.status,
-                        "message": f"API error: {error_text}"
-                    }
-
-                models_data = await response.json()
-
-                # Extract available models that match our preferences
-                available_models = []
-                for model in models_data.get("data", []):
-                    if "deepseek" in model.get("id", "") or "gpt" in model.get("id", ""):
-                        available_models.append({
-                            "id": model.get("id"),
-                            "name": model.get("name"),
-                            "context_length": model.get("context_length")
-                        })
-
+        session = await SessionRegistry.get_session(Upstream.OPENROUTER)
+        # First test a basic models list request
+        async with session.get(
+            url="https://openrouter.ai/api/v1/models",
+            headers={
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json",
+            }
+        ) as response:
+            if response.status != 200:
+                error_text = await response.text()
                 return {
-                    "status": "success",
-                    "message": "Connection successful",
-                    "available_models": available_models
+                    "status": "error",
+                    "code": response.status,
+                    "message": f"API error: {error_text}"
                 }
 
+            models_data = await response.json()
+
+            # Extract available models that match our preferences
+            available_models = []
+            for model in models_data.get("data", []):
+                if "deepseek" in model.get("id", "") or "gpt" in model.get("id", ""):
+                    available_models.append({
+                        "id": model.get("id"),
+                        "name": model.get("name"),
+                        "context_length": model.get("context_length")
+                    })
+
+            return {
+                "status": "success",
+                "message": "Connection successful",
+                "available_models": available_models
+            }
+
     except Exception as e:
         return {"status": "error", "message": f"Connection error: {str(e)}"}
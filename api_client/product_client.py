@@ -1,68 +1,147 @@
 # language: python
-import asyncio
+import logging
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
 
-import aiohttp
+from yarl import URL
 
-from api.structure.models import Product
-from ..config import settings
+from api.structure.models import Product, ProductPage
+from api_client.base_client import BackendClient
+from config import settings
 
+logger = logging.getLogger(__name__)
 
-class ProductClient:
+
+class ProductClient(BackendClient):
     BASE_URL = settings.PRODUCTSS_API_URL
+    TIMEOUTS = {
+        "products.list": 10.0,
+        "products.mine": 10.0,
+        "products.retrieve": 5.0,
+        "products.create": 15.0,
+        "products.update": 15.0,
+        "products.partial_update": 15.0,
+        "products.delete": 10.0,
+    }
+
+    @classmethod
+    def _create_product_from_data(cls, data: Dict[str, Any]) -> Product:
+        # Convert date strings to datetime objects without mutating the payload,
+        # which may be shared between coalesced callers
+        return Product(**{
+            **data,
+            "created_at": datetime.fromisoformat(data["created_at"]),
+            "updated_at": datetime.fromisoformat(data["updated_at"]),
+        })
+
+    @staticmethod
+    def _split_page(data: Any) -> Tuple[List[Dict[str, Any]], Optional[str], Optional[int]]:
+        """
+        Split a list response into its items, the next page URL and the total count.
+        Supports both paginated (``{"count", "next", "results"}``) and plain list payloads.
+        """
+        if isinstance(data, dict) and "results" in data:
+            return data["results"], data.get("next"), data.get("count")
+        items = data or []
+        return items, None, len(items)
 
     @classmethod
-    async def _create_product_from_data(cls, data: Dict[str, Any]) -> Product:
-     # Convert date strings to datetime objects
-     data["created_at"] = datetime.fromisoformat(data["created_at"])
-     data["updated_at"] = datetime.fromisoformat(data["updated_at"])
-     # Create Product instance with unpacked dictionary
-     return Product(**data)
+    async def _fetch_page(cls, path: str, endpoint: str, params: Dict[str, Any], auth: bool) -> Any:
+        return await cls._request(
+            "GET", path, endpoint=endpoint, params=params, coalesce=True, cache_tags=("products",), auth=auth
+        )
+
+    @classmethod
+    async def _iter_pages(cls, path: str, endpoint: str, page_size: int,
+                          auth: bool) -> AsyncIterator[Product]:
+        """
+        Follow the backend's pagination cursors, decoding one page at a time.
+        """
+        params: Optional[Dict[str, Any]] = {"page_size": page_size}
+        while params is not None:
+            items, next_url, _ = cls._split_page(await cls._fetch_page(path, endpoint, params, auth))
+            for item in items:
+                yield cls._create_product_from_data(item)
+            # Reuse the cursor from the next link, whichever pagination style the backend uses
+            params = dict(URL(next_url).query) if next_url else None
+
+    @classmethod
+    def iter_products(cls, page_size: int = settings.PRODUCTS_PAGE_SIZE) -> AsyncIterator[Product]:
+        """
+        Iterate over the whole catalog, fetching ``page_size`` products per request.
+        """
+        # The catalog is the same for everyone, so it is fetched anonymously and cached once
+        return cls._iter_pages("", "products.list", page_size, auth=False)
+
+    @classmethod
+    async def get_products_page(cls, page: int = 1,
+                                page_size: int = settings.PRODUCTS_PAGE_SIZE) -> ProductPage:
+        """
+        Fetch a single page of the catalog.
+
+        A backend without pagination returns the whole catalog as a plain
+        list; the requested page is then sliced from it here, so callers
+        still get one page at a time, though the whole list is transferred.
+        """
+        data = await cls._fetch_page("", "products.list", {"page": page, "page_size": page_size}, auth=False)
+        items, next_url, count = cls._split_page(data)
+        has_next = next_url is not None
+        if not isinstance(data, dict):
+            logger.warning("Products endpoint isn't paginated; slicing the full catalog on the client")
+            start = (page - 1) * page_size
+            has_next = len(items) > start + page_size
+            items = items[start:start + page_size]
+        return ProductPage(
+            items=[cls._create_product_from_data(item) for item in items],
+            page=page,
+            has_next=has_next,
+            count=count,
+        )
 
     @classmethod
     async def list_products(cls) -> List[Product]:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"{cls.BASE_URL}/") as response:
-                data = await response.json()
-                return await asyncio.gather(*[cls._create_product_from_data(item) for item in data])
+        return [product async for product in cls.iter_products()]
 
     @classmethod
     async def create_product(cls, product_data: Dict[str, Any]) -> Product:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(f"{cls.BASE_URL}/", json=product_data) as response:
-                data = await response.json()
-                return await cls._create_product_from_data(data)
+        data = await cls._request("POST", endpoint="products.create", json=product_data)
+        await cls._invalidate_cache("products")
+        return cls._create_product_from_data(data)
 
     @classmethod
     async def get_product(cls, product_id: int) -> Product:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"{cls.BASE_URL}/{product_id}/") as response:
-                data = await response.json()
-                return await cls._create_product_from_data(data)
+        data = await cls._request(
+            "GET", f"{product_id}/", endpoint="products.retrieve",
+            coalesce=True, cache_tags=(f"product:{product_id}",), auth=False
+        )
+        return cls._create_product_from_data(data)
 
     @classmethod
     async def update_product(cls, product_id: int, product_data: Dict[str, Any]) -> Product:
-        async with aiohttp.ClientSession() as session:
-            async with session.put(f"{cls.BASE_URL}/{product_id}/", json=product_data) as response:
-                data = await response.json()
-                return await cls._create_product_from_data(data)
+        data = await cls._request("PUT", f"{product_id}/", endpoint="products.update", json=product_data)
+        await cls._invalidate_cache("products", f"product:{product_id}")
+        return cls._create_product_from_data(data)
 
     @classmethod
     async def partial_update_product(cls, product_id: int, product_data: Dict[str, Any]) -> Product:
-        async with aiohttp.ClientSession() as session:
-            async with session.patch(f"{cls.BASE_URL}/{product_id}/", json=product_data) as response:
-                data = await response.json()
-                return await cls._create_product_from_data(data)
+        data = await cls._request(
+            "PATCH", f"{product_id}/", endpoint="products.partial_update", json=product_data
+        )
+        await cls._invalidate_cache("products", f"product:{product_id}")
+        return cls._create_product_from_data(data)
 
     @classmethod
     async def delete_product(cls, product_id: int) -> None:
-        async with aiohttp.ClientSession() as session:
-            await session.delete(f"{cls.BASE_URL}/{product_id}/")
+        await cls._request("DELETE", f"{product_id}/", endpoint="products.delete")
+        await cls._invalidate_cache("products", f"product:{product_id}")
+
+    @classmethod
+    def iter_my_products(cls, page_size: int = settings.PRODUCTS_PAGE_SIZE) -> AsyncIterator[Product]:
+        """
+        Iterate over the current user's products, one page per request.
+        """
+        return cls._iter_pages("mine/", "products.mine", page_size, auth=True)
 
     @classmethod
     async def my_products(cls) -> List[Product]:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"{cls.BASE_URL}/mine/") as response:
-                data = await response.json()
-                return await asyncio.gather(*[cls._create_product_from_data(item) for item in data])
+        return [product async for product in cls.iter_my_products()]
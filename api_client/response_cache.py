@@ -0,0 +1,153 @@
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, asdict, field
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from redis.exceptions import RedisError
+
+from config import settings
+from redis_client.connection import RedisConnection
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedResponse:
+    """
+    A decoded backend response together with its revalidation validators.
+    """
+    data: Any
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    stored_at: float = 0.0
+    tags: List[str] = field(default_factory=list)
+
+    def is_fresh(self, ttl: float) -> bool:
+        return time.time() - self.stored_at < ttl
+
+    @property
+    def can_revalidate(self) -> bool:
+        return bool(self.etag or self.last_modified)
+
+    def conditional_headers(self) -> Dict[str, str]:
+        """
+        Headers that turn a GET into a conditional request for this entry.
+        """
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    """
+    Two-tier cache for backend GET responses.
+
+    Entries live in a small in-process LRU in front of Redis. The local tier
+    only holds entries for a few seconds so that invalidations issued by
+    other nodes (which clear Redis) take effect quickly. Redis keeps entries
+    well beyond their freshness window so stale ones can still be
+    revalidated with ETag / Last-Modified instead of being downloaded again.
+
+    Entries are grouped by tags; invalidating a tag drops every entry
+    registered under it from both tiers.
+    """
+    KEY_PREFIX = "response_cache:"
+    TAG_PREFIX = "response_cache:tag:"
+
+    def __init__(self, max_local_entries: int = settings.RESPONSE_CACHE_LOCAL_SIZE,
+                 local_ttl: float = settings.RESPONSE_CACHE_LOCAL_TTL,
+                 retention: int = settings.RESPONSE_CACHE_RETENTION):
+        self.max_local_entries = max_local_entries
+        self.local_ttl = local_ttl
+        self.retention = retention
+        self._local: "OrderedDict[str, tuple[CachedResponse, float]]" = OrderedDict()
+        self._local_tags: Dict[str, Set[str]] = {}
+
+    def _get_local(self, key: str) -> Optional[CachedResponse]:
+        item = self._local.get(key)
+        if item is None:
+            return None
+        entry, expires_at = item
+        if expires_at < time.monotonic():
+            del self._local[key]
+            return None
+        self._local.move_to_end(key)
+        return entry
+
+    def _set_local(self, key: str, entry: CachedResponse) -> None:
+        self._local[key] = (entry, time.monotonic() + self.local_ttl)
+        self._local.move_to_end(key)
+        for tag in entry.tags:
+            self._local_tags.setdefault(tag, set()).add(key)
+        while len(self._local) > self.max_local_entries:
+            evicted_key, (evicted, _) = self._local.popitem(last=False)
+            for tag in evicted.tags:
+                self._local_tags.get(tag, set()).discard(evicted_key)
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        """
+        Look up an entry, checking the local tier before Redis.
+        """
+        entry = self._get_local(key)
+        if entry is not None:
+            return entry
+
+        try:
+            pool = await RedisConnection.get_pool()
+            raw = await pool.get(f"{self.KEY_PREFIX}{key}")
+        except RedisError as e:
+            logger.warning(f"Response cache lookup failed: {e}")
+            return None
+        if raw is None:
+            return None
+
+        try:
+            entry = CachedResponse(**json.loads(raw))
+        except (TypeError, ValueError):
+            return None
+        self._set_local(key, entry)
+        return entry
+
+    async def set(self, key: str, entry: CachedResponse, tags: Iterable[str]) -> None:
+        """
+        Store an entry in both tiers and register it under its tags.
+        """
+        entry.tags = list(tags)
+        self._set_local(key, entry)
+
+        redis_key = f"{self.KEY_PREFIX}{key}"
+        try:
+            pool = await RedisConnection.get_pool()
+            async with pool.pipeline(transaction=False) as pipe:
+                pipe.set(redis_key, json.dumps(asdict(entry)), ex=self.retention)
+                for tag in entry.tags:
+                    pipe.sadd(f"{self.TAG_PREFIX}{tag}", redis_key)
+                    pipe.expire(f"{self.TAG_PREFIX}{tag}", self.retention)
+                await pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Response cache store failed: {e}")
+
+    async def invalidate(self, *tags: str) -> None:
+        """
+        Drop every entry registered under any of the given tags.
+        """
+        for tag in tags:
+            for key in self._local_tags.pop(tag, ()):
+                self._local.pop(key, None)
+
+        try:
+            pool = await RedisConnection.get_pool()
+            tag_keys = [f"{self.TAG_PREFIX}{tag}" for tag in tags]
+            async with pool.pipeline(transaction=False) as pipe:
+                for tag_key in tag_keys:
+                    pipe.smembers(tag_key)
+                members = await pipe.execute()
+            keys = set().union(*members) if members else set()
+            await pool.delete(*keys, *tag_keys)
+        except RedisError as e:
+            logger.warning(f"Response cache invalidation failed: {e}")
@@ -0,0 +1,101 @@
+from asyncio import Lock
+from enum import Enum
+from typing import Dict, Optional, Type
+
+import aiohttp
+
+from config import settings
+
+
+class Upstream(Enum):
+    BACKEND = "backend"
+    OPENROUTER = "openrouter"
+
+
+class SessionRegistry:
+    """
+    Registry of shared aiohttp sessions, one pooled session per upstream.
+
+    Sessions are created lazily on first use (or eagerly via ``startup``) and
+    reuse their TCP/TLS connections across requests. They must be closed with
+    ``shutdown`` when the bot stops.
+
+    Attributes:
+        _sessions: Open sessions keyed by upstream
+        _request_classes: Custom request classes (e.g. for signing) keyed by upstream
+        _lock: Asyncio lock guarding session creation
+    """
+    _sessions: Dict[Upstream, aiohttp.ClientSession] = {}
+    _request_classes: Dict[Upstream, Type[aiohttp.ClientRequest]] = {}
+    _lock = Lock()
+
+    @staticmethod
+    def _create_connector() -> aiohttp.TCPConnector:
+        """
+        Build a pooled connector configured from settings.
+        """
+        return aiohttp.TCPConnector(
+            limit=settings.HTTP_POOL_LIMIT,
+            limit_per_host=settings.HTTP_POOL_LIMIT_PER_HOST,
+            keepalive_timeout=settings.HTTP_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=settings.HTTP_DNS_CACHE_TTL,
+        )
+
+    @classmethod
+    def _create_session(cls, upstream: Upstream) -> aiohttp.ClientSession:
+        """
+        Create a new session for the given upstream with its own connector.
+        """
+        return aiohttp.ClientSession(
+            connector=cls._create_connector(),
+            request_class=cls._request_classes.get(upstream, aiohttp.ClientRequest),
+        )
+
+    @classmethod
+    def set_request_class(cls, upstream: Upstream,
+                          request_class: Optional[Type[aiohttp.ClientRequest]]) -> None:
+        """
+        Use a custom request class for an upstream's session, or restore the default with None.
+        Only sessions opened afterwards are affected.
+        """
+        if request_class is None:
+            cls._request_classes.pop(upstream, None)
+        else:
+            cls._request_classes[upstream] = request_class
+
+    @classmethod
+    async def get_session(cls, upstream: Upstream) -> aiohttp.ClientSession:
+        """
+        Get or create the shared session for an upstream.
+
+        Uses double-checked locking so concurrent callers never create
+        more than one session per upstream.
+        """
+        session = cls._sessions.get(upstream)
+        if session is None or session.closed:
+            async with cls._lock:
+                session = cls._sessions.get(upstream)
+                if session is None or session.closed:  # Double-check after acquiring lock
+                    session = cls._create_session(upstream)
+                    cls._sessions[upstream] = session
+        return session
+
+    @classmethod
+    async def startup(cls) -> None:
+        """
+        Eagerly open a session for every known upstream.
+        """
+        for upstream in Upstream:
+            await cls.get_session(upstream)
+
+    @classmethod
+    async def shutdown(cls) -> None:
+        """
+        Close all open sessions and release their pooled connections.
+        """
+        async with cls._lock:
+            sessions, cls._sessions = cls._sessions, {}
+        for session in sessions.values():
+            if not session.closed:
+                await session.close()
+
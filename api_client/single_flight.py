@@ -0,0 +1,54 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls that share a key into a single execution.
+
+    The first caller for a key starts the work as a task; every caller that
+    arrives while it is still running awaits the same task and receives the
+    same result (or exception). Results are shared between callers, so they
+    must be treated as read-only.
+
+    Attributes:
+        executed: Number of calls that actually ran
+        collapsed: Number of calls that were served by an in-flight call
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.executed = 0
+        self.collapsed = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run ``func`` for ``key`` unless an identical call is already in flight.
+        """
+        task = self._calls.get(key)
+        if task is not None:
+            self.collapsed += 1
+        else:
+            self.executed += 1
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(lambda finished: self._forget(key, finished))
+
+        # Shield the shared task so one cancelled caller doesn't fail the others
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        """
+        Drop a finished call so the next caller triggers a fresh execution.
+        """
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the exception as retrieved in case every caller was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def is_in_flight(self, key: Hashable) -> bool:
+        """
+        Check whether a call for ``key`` is currently running.
+        """
+        return key in self._calls
@@ -0,0 +1,195 @@
+import asyncio
+import logging
+import time
+import uuid
+from typing import Dict, Optional
+
+from redis.exceptions import RedisError
+
+from api_client.auth_client import AuthClient, TOKEN_EXPIRY_KEY
+from api_client.exceptions.common import ApiClientError
+from api_client.single_flight import SingleFlight
+from config import settings
+from redis_client.auth_state import AuthStateRepository
+from redis_client.connection import RedisConnection
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_USERS_KEY = "auth:active_users"
+REFRESH_LOCK_PREFIX = "auth:refresh_lock:"
+
+# Delete the lock only if it still holds our token, so a lock that expired
+# and was taken over by another node is never released by us
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class TokenRefresher:
+    """
+    Refreshes access tokens shortly before they expire.
+
+    Token expiry times are tracked in a Redis sorted set by AuthClient. A
+    background loop picks the tokens that are about to expire and refreshes
+    those of users seen recently, so their next message doesn't wait on a
+    synchronous refresh. Refreshes for the same user are collapsed in-process,
+    bounded by a semaphore, and serialized across nodes with a Redis lock.
+
+    Attributes:
+        _single_flight: Collapses concurrent refreshes of the same user
+        _semaphore: Bounds the number of refreshes running at once
+        _last_seen: Local throttle for activity updates, keyed by telegram id
+        _task: Background scheduling loop
+    """
+    _single_flight = SingleFlight()
+    _semaphore: Optional[asyncio.Semaphore] = None
+    _last_seen: Dict[str, float] = {}
+    _task: Optional[asyncio.Task] = None
+
+    @classmethod
+    async def touch(cls, telegram_id) -> None:
+        """
+        Record that a user is active, writing to Redis at most once per interval.
+        """
+        key = str(telegram_id)
+        now = time.time()
+        if now - cls._last_seen.get(key, 0.0) < settings.TOKEN_ACTIVITY_TOUCH_INTERVAL:
+            return
+        if len(cls._last_seen) >= settings.TOKEN_CACHE_MAX_SIZE:
+            cutoff = now - settings.TOKEN_ACTIVITY_TOUCH_INTERVAL
+            cls._last_seen = {k: seen for k, seen in cls._last_seen.items() if seen >= cutoff}
+        cls._last_seen[key] = now
+        try:
+            pool = await RedisConnection.get_pool()
+            await pool.zadd(ACTIVE_USERS_KEY, {key: now})
+        except RedisError as e:
+            logger.warning(f"Failed to record activity for {telegram_id}: {e}")
+
+    @classmethod
+    async def refresh(cls, telegram_id, wait: bool = True) -> Optional[str]:
+        """
+        Refresh a user's access token, collapsing concurrent calls.
+
+        Args:
+            telegram_id: User whose token should be refreshed
+            wait: If another node holds the refresh lock, wait for its result
+                  instead of giving up
+
+        Returns:
+            The new access token, or None if it could not be refreshed.
+        """
+        key = str(telegram_id)
+        return await cls._single_flight.do(key, lambda: cls._refresh(key, wait))
+
+    @classmethod
+    async def _refresh(cls, telegram_id: str, wait: bool) -> Optional[str]:
+        if cls._semaphore is None:
+            cls._semaphore = asyncio.Semaphore(settings.TOKEN_REFRESH_CONCURRENCY)
+
+        async with cls._semaphore:
+            pool = await RedisConnection.get_pool()
+            lock_key = f"{REFRESH_LOCK_PREFIX}{telegram_id}"
+            lock_token = uuid.uuid4().hex
+            if not await pool.set(lock_key, lock_token, nx=True, ex=settings.TOKEN_REFRESH_LOCK_TIMEOUT):
+                return await cls._wait_for_other_node(pool, telegram_id) if wait else None
+
+            try:
+                refresh_token = (await AuthStateRepository.get(pool, telegram_id)).refresh
+                if not refresh_token:
+                    await pool.zrem(TOKEN_EXPIRY_KEY, telegram_id)
+                    return None
+                try:
+                    data = await AuthClient.refresh_token({"refresh": refresh_token, "telegram_id": telegram_id})
+                except ApiClientError as e:
+                    logger.warning(f"Token refresh failed for {telegram_id}: {e}")
+                    if e.status in (400, 401):
+                        # The refresh token was rejected; retrying won't help
+                        await pool.zrem(TOKEN_EXPIRY_KEY, telegram_id)
+                    return None
+                return data.get("access")
+            finally:
+                await pool.eval(_RELEASE_LOCK_SCRIPT, 1, lock_key, lock_token)
+
+    @staticmethod
+    async def _wait_for_other_node(pool, telegram_id: str) -> Optional[str]:
+        """
+        Poll for the access token stored by the node holding the refresh lock.
+        """
+        lock_key = f"{REFRESH_LOCK_PREFIX}{telegram_id}"
+        deadline = time.monotonic() + settings.TOKEN_REFRESH_LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+            if not await pool.exists(lock_key):
+                return (await AuthStateRepository.get(pool, telegram_id)).access
+        return None
+
+    @classmethod
+    async def run_once(cls) -> int:
+        """
+        Refresh the tokens of active users that expire within the lead time.
+
+        Returns:
+            Number of refreshes started.
+        """
+        pool = await RedisConnection.get_pool()
+        now = time.time()
+
+        async with pool.pipeline(transaction=False) as pipe:
+            # Tokens that already expired are refreshed lazily on the next message
+            pipe.zremrangebyscore(TOKEN_EXPIRY_KEY, "-inf", now)
+            pipe.zrangebyscore(TOKEN_EXPIRY_KEY, now, now + settings.TOKEN_REFRESH_LEAD_TIME)
+            pipe.zremrangebyscore(ACTIVE_USERS_KEY, "-inf", now - settings.TOKEN_REFRESH_ACTIVE_WINDOW)
+            _, expiring, _ = await pipe.execute()
+
+        if not expiring:
+            return 0
+
+        async with pool.pipeline(transaction=False) as pipe:
+            for telegram_id in expiring:
+                pipe.zscore(ACTIVE_USERS_KEY, telegram_id)
+            last_seen = await pipe.execute()
+
+        active = [telegram_id for telegram_id, seen in zip(expiring, last_seen) if seen is not None]
+        if active:
+            await asyncio.gather(
+                *(cls.refresh(telegram_id, wait=False) for telegram_id in active),
+                return_exceptions=True,
+            )
+        return len(active)
+
+    @classmethod
+    async def _loop(cls) -> None:
+        while True:
+            try:
+                refreshed = await cls.run_once()
+                if refreshed:
+                    logger.debug(f"Proactively refreshed {refreshed} access tokens")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Token refresh scheduler iteration failed: {e}")
+            await asyncio.sleep(settings.TOKEN_REFRESH_INTERVAL)
+
+    @classmethod
+    def start(cls) -> None:
+        """
+        Start the background refresh loop.
+        """
+        if cls._task is None or cls._task.done():
+            cls._task = asyncio.create_task(cls._loop())
+
+    @classmethod
+    async def stop(cls) -> None:
+        """
+        Stop the background refresh loop.
+        """
+        if cls._task is not None:
+            cls._task.cancel()
+            try:
+                await cls._task
+            except asyncio.CancelledError:
+                pass
+            cls._task = None
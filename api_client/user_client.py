@@ -1,91 +1,109 @@
-import functools
-
-import aiohttp
+from datetime import datetime
+from typing import Dict, List, Optional
 
 from api.structure.models import User
+from .base_client import BackendClient, current_auth
+from .batch_loader import BatchLoader
 from .exceptions.common import ApiClientError
 from config import settings
 
 
-class UserClient:
+class UserClient(BackendClient):
     """
     Asynchronous client for interacting with the user management API.
     Provides methods to get, update, and delete users.
     """
 
     BASE_URL = settings.USERS_API_URL
+    TIMEOUTS = {
+        "users.retrieve": 5.0,
+        "users.list": 10.0,
+        "users.update": 10.0,
+        "users.delete": 10.0,
+    }
+
+    _user_loader: Optional[BatchLoader] = None
 
     @staticmethod
-    def _handle_user_response(many: bool = False):
+    def _create_user_from_data(data: dict) -> User:
         """
-        Decorator to handle user API responses.
-        Parses the response and returns User instances or a list of Users.
+        Instantiates a User object from a dictionary of user data.
         """
+        date_joined = data.get("date_joined")
+        if isinstance(date_joined, str):
+            data = {**data, "date_joined": datetime.fromisoformat(date_joined)}
+        return User(**data)
 
-        def decorator(func):
-            @functools.wraps(func)
-            async def wrapper(self, *args, **kwargs):
-                async with aiohttp.ClientSession() as session:
-                    async with await func(self, session, *args, **kwargs) as response:
-                        data = await self._extract_data(response)
-                        if many:
-                            return [self._create_user_from_data(user) for user in data]
-                        return self._create_user_from_data(data)
-
-            return wrapper
-
-        return decorator
-
-    @staticmethod
-    async def _extract_data(response: aiohttp.ClientResponse) -> dict:
+    @classmethod
+    async def get_user(cls, user_id: str) -> User:
         """
-        Extracts and returns the 'data' field from the API response.
-        Raises ApiClientError if the response indicates failure.
+        Retrieves a single user by user ID.
         """
-        response_json = await response.json()
-        if not response_json.get("success", True):
-            raise ApiClientError(response_json.get("message", "Unknown error"))
-        return response_json.get("data", {})
+        data = await cls._request("GET", f"{user_id}/", endpoint="users.retrieve", coalesce=True)
+        return cls._create_user_from_data(data)
 
-    @staticmethod
-    def _create_user_from_data(data: dict) -> User:
+    @classmethod
+    async def load_user(cls, user_id: int) -> User:
         """
-        Instantiates a User object from a dictionary of user data.
+        Retrieves a single user by user ID, batched with every other ``load_user``
+        call made on behalf of the same user in the same event-loop tick.
+        Results are reused for the rest of the current update.
+
+        Batching needs the backend's ``id__in`` filter (``USERS_BULK_LOOKUP``);
+        without it each user is fetched with ``get_user``, which still shares
+        identical in-flight requests.
         """
-        return User(**data)
+        if not settings.USERS_BULK_LOOKUP:
+            return await cls.get_user(user_id)
+        if cls._user_loader is None:
+            cls._user_loader = BatchLoader(
+                cls._load_users,
+                max_batch_size=settings.USER_LOADER_MAX_BATCH,
+                batch_delay=settings.USER_LOADER_BATCH_DELAY,
+                name="user_loader",
+                # Lookups are authenticated with the asking user's token
+                scope_fn=lambda: getattr(current_auth.get(), "telegram_id", None),
+            )
+        return await cls._user_loader.load(int(user_id))
 
     @classmethod
-    @_handle_user_response
-    async def get_user(cls, session, user_id: str):
+    async def _load_users(cls, user_ids: List[int]) -> Dict[int, User | Exception]:
         """
-        Retrieves a single user by user ID.
+        Resolves a batch of user IDs with one ``id__in`` query, or a single
+        ID with the single-user endpoint.
         """
-        return session.get(f"{cls.BASE_URL}/{user_id}/")
+        if len(user_ids) == 1:
+            try:
+                return {user_ids[0]: await cls.get_user(user_ids[0])}
+            except Exception as e:
+                return {user_ids[0]: e}
+
+        users = await cls.get_users(id__in=",".join(map(str, user_ids)))
+        found: Dict[int, User | Exception] = {user.id: user for user in users}
+        for user_id in user_ids:
+            found.setdefault(user_id, ApiClientError(f"User {user_id} not found", status=404))
+        return found
 
     @classmethod
-    @_handle_user_response(many=True)
-    async def get_users(cls, session, **params):
+    async def get_users(cls, **params) -> list[User]:
         """
         Retrieves a list of users, optionally filtered by query parameters.
         """
-        return session.get(cls.BASE_URL, params=params)
+        data = await cls._request("GET", endpoint="users.list", params=params)
+        return [cls._create_user_from_data(user) for user in data]
 
     @classmethod
-    @_handle_user_response
-    async def update_user(cls, session, user_id: str, user_data: dict):
+    async def update_user(cls, user_id: str, user_data: dict) -> User:
         """
         Updates a user's information.
         """
-        return session.patch(f"{cls.BASE_URL}/{user_id}/", json=user_data)
+        data = await cls._request("PATCH", f"{user_id}/", endpoint="users.update", json=user_data)
+        return cls._create_user_from_data(data)
 
     @classmethod
-    @_handle_user_response
-    async def delete_user(cls, session, user_id: str):
+    async def delete_user(cls, user_id: str) -> None:
         """
         Deletes a user by user ID.
         Returns None if deletion is successful (HTTP 204).
         """
-        response = await session.delete(f"{cls.BASE_URL}/{user_id}/")
-        if response.status == 204:
-            return None
-        return response
+        await cls._request("DELETE", f"{user_id}/", endpoint="users.delete")
@@ -1,3 +1,5 @@
+from typing import Dict, List
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -16,10 +18,78 @@ class Settings(BaseSettings):
     REDIS_PASSWORD: str = ''  # Password for Redis connection
     ACCESS_TOKEN_LIFETIME: int = 3600  # Access token lifetime in seconds
     REFRESH_TOKEN_LIFETIME: int = 3600  # Refresh token lifetime in seconds
+    JWT_SIGNING_KEY: str = ''  # Backend's HS256/384/512 JWT signing key; enables local token verification
+    JWT_STAFF_CLAIM: str = 'is_staff'  # Access token claim carrying the staff flag, if the backend adds one
+    JWT_LEEWAY: float = 0.0  # Seconds of clock skew tolerated when checking token expiry
+    USER_KEY_INDEX_TTL: int = 60 * 60 * 24 * 7  # Lifetime of a user's key index; covers the longest-lived user key
+    TOKEN_CACHE_MAX_TTL: float = 300.0  # Max seconds an access token is served from the in-process cache
+    TOKEN_CACHE_NEGATIVE_TTL: float = 30.0  # Seconds a missing token is remembered in-process
+    TOKEN_CACHE_MAX_SIZE: int = 10000  # Max telegram ids kept in the in-process token cache
+    STAFF_CACHE_TTL: float = 300.0  # Seconds a granted staff status is served in-process
+    STAFF_CACHE_NEGATIVE_TTL: float = 60.0  # Seconds a denied staff status is served in-process
+    TOKEN_REFRESH_INTERVAL: float = 15.0  # Seconds between proactive refresh scans
+    TOKEN_REFRESH_LEAD_TIME: int = 120  # Refresh access tokens this many seconds before they expire
+    TOKEN_REFRESH_ACTIVE_WINDOW: int = 1800  # Only users seen within this many seconds are refreshed
+    TOKEN_REFRESH_CONCURRENCY: int = 10  # Max token refreshes running at once
+    TOKEN_REFRESH_LOCK_TIMEOUT: int = 15  # Seconds a node holds a user's refresh lock
+    TOKEN_ACTIVITY_TOUCH_INTERVAL: float = 60.0  # Min seconds between a user's last-seen updates
 
     SIGNATURE_AUTH_SECRET_KEY: str = ''  # Secret key for signature authentication
+    SIGNATURE_BODY_MODE: str = 'raw'  # Body canonicalization agreed with Django: 'raw' or 'digest'
 
     OPENROUTER_API_KEY: str = ''  # API key for OpenRouter
+    LLM_MODELS: List[str] = [  # Models in order of preference
+        'deepseek/deepseek-r1:free',
+        'openai/gpt-3.5-turbo',
+        'meta/llama-3-instruct:1:latest',
+    ]
+    LLM_CONTEXT_BUDGET: int = 3000  # Default prompt token budget per request
+    LLM_CONTEXT_BUDGETS: Dict[str, int] = {}  # Per-model prompt token budgets, e.g. {"openai/gpt-3.5-turbo": 3000}
+    CONVERSATION_MAX_MESSAGES: int = 500  # Safety cap on messages kept in Redis; the token budget trims history into the summary
+    CONVERSATION_SUMMARY_MAX_TOKENS: int = 300  # Size of the rolling summary of turns outside the window
+    LLM_HEDGE_DELAY: float = 4.0  # Seconds without the first streamed token before the next model is also tried
+    LLM_COMPLETION_HEDGE_DELAY: float = 15.0  # Seconds without a whole non-streamed answer before the next model is also tried
+    LLM_DEADLINE: float = 45.0  # Max seconds to wait for any model to start answering
+    LLM_HEALTH_WINDOW: int = 50  # Recent calls per model behind its success rate and latency percentiles
+    LLM_HEALTH_MIN_SAMPLES: int = 5  # Calls needed before a model's statistics affect its rank
+    LLM_HEALTH_MIN_SUCCESS_RATE: float = 0.8  # Models succeeding less often are tried after healthy ones
+    LLM_BREAKER_FAILURE_THRESHOLD: int = 3  # Consecutive failures that eject a model
+    LLM_BREAKER_COOLDOWN: float = 60.0  # Seconds an ejected model is skipped before it is probed again
+    LLM_ANSWER_CACHE: bool = True  # Answer repeated context-free questions from Redis without calling a model
+    LLM_ANSWER_CACHE_TTL: int = 60 * 60 * 24  # Seconds a cached answer is served
+    LLM_ANSWER_CACHE_MAX_QUESTION_LENGTH: int = 200  # Longer questions (after normalization) are never cached
+    INTENT_ROUTER: bool = True  # Answer command-style questions from templates before calling a model
+    INTENT_MAX_WORDS: int = 8  # Longer messages are always left to the AI assistant
+    INTENT_FUZZY_MIN_LENGTH: int = 6  # Shorter single words without a slash are never taken for misspelled commands
+    LLM_MAX_CONCURRENCY: int = 8  # Max AI replies generated at once across all users
+    LLM_QUEUE_MAX_DEPTH: int = 50  # Users waiting for a reply beyond which new messages get a busy reply
+    LLM_QUEUE_MAX_WAIT: float = 30.0  # Seconds a message may wait for its turn before it gets a busy reply
+    LLM_DEBOUNCE_DELAY: float = 1.5  # Seconds of quiet after which messages sent while a user's AI turn is in flight form one turn
+    LLM_DAILY_TOKEN_QUOTA: int = 20000  # Tokens a user may spend per UTC day; 0 = unlimited
+    LLM_MONTHLY_TOKEN_QUOTA: int = 200000  # Tokens a user may spend per UTC month; 0 = unlimited
+    LLM_STREAMING: bool = True  # Stream AI replies into a progressively edited message
+    STREAM_EDIT_INTERVAL: float = 1.0  # Min seconds between edits of a streamed message
+
+    HTTP_POOL_LIMIT: int = 100  # Max simultaneous connections per upstream session
+    HTTP_POOL_LIMIT_PER_HOST: int = 30  # Max simultaneous connections to a single host
+    HTTP_KEEPALIVE_TIMEOUT: float = 30.0  # Seconds an idle pooled connection is kept open
+    HTTP_DNS_CACHE_TTL: int = 300  # Seconds resolved DNS entries are cached
+
+    BACKEND_TIMEOUT: float = 10.0  # Default per-request timeout budget for backend calls
+    BACKEND_MAX_RETRIES: int = 2  # Retries for idempotent backend requests
+    BACKEND_RETRY_BACKOFF: float = 0.2  # Base delay in seconds for jittered exponential backoff
+    BACKEND_RETRY_BACKOFF_MAX: float = 2.0  # Upper bound in seconds for a single backoff delay
+
+    RESPONSE_CACHE_TTL: float = 30.0  # Seconds a cached backend response is served without revalidation
+    RESPONSE_CACHE_LOCAL_TTL: float = 5.0  # Seconds an entry stays in the in-process tier
+    RESPONSE_CACHE_LOCAL_SIZE: int = 256  # Max entries in the in-process tier
+    RESPONSE_CACHE_RETENTION: int = 3600  # Seconds entries are kept in Redis for revalidation
+
+    PRODUCTS_PAGE_SIZE: int = 10  # Products fetched per backend request and shown per page
+
+    USERS_BULK_LOOKUP: bool = False  # Backend supports ?id__in= filtering; without it user lookups aren't batched
+    USER_LOADER_MAX_BATCH: int = 50  # Max user ids resolved by a single batched lookup
+    USER_LOADER_BATCH_DELAY: float = 0.0  # Seconds to collect ids before dispatching; 0 = one loop tick
 
     # Derived URLs
     @property
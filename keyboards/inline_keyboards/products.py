@@ -19,3 +19,10 @@ def get_public_product_keyboard(product_id: int) -> InlineKeyboardMarkup:
             InlineKeyboardButton(text=_('Call Owner 📞'), callback_data=f'call_owner_{product_id}')
         ]
     ])
+
+def get_products_pagination_keyboard(next_page: int) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [
+            InlineKeyboardButton(text=_('Next Page ➡️'), callback_data=f'products_page_{next_page}')
+        ]
+    ])
@@ -3,10 +3,16 @@ from pathlib import Path
 from aiogram import Dispatcher, Bot
 from aiogram.utils.i18n import I18n, SimpleI18nMiddleware
 
+from api_client.sessions import SessionRegistry
+from api_client.token_refresher import TokenRefresher
 from config import settings
 from middlewares.auth_middleware import AuthMiddleware
 from middlewares.signature_middleware import uninstall_signature_middleware, \
-    install_signature_middleware
+    install_signature_middleware, check_body_signing
+from redis_client.auth_state import AuthStateRepository
+from redis_client.connection import RedisConnection
+from redis_client.conversation_history import ConversationHistoryManager
+from redis_client.token_cache import TokenCache
 from routers import router
 
 
@@ -15,13 +21,28 @@ async def startup():
     Initialize resources needed for the bot before starting.
 
     Sets up the signature middleware for authenticating API requests
-    using the secret key from settings.
+    using the secret key from settings and checks that it signs request
+    bodies as the installed aiohttp sends them, opens the shared HTTP sessions,
+    moves auth state and conversations still stored under the legacy keys
+    into their current layout, starts listening for access token invalidations
+    from other nodes and starts refreshing active users' tokens ahead of expiry.
     """
     install_signature_middleware(
         secret_key=settings.SIGNATURE_AUTH_SECRET_KEY,
         backend_urls=settings.BASE_URL,  # Only your backend!
+        body_mode=settings.SIGNATURE_BODY_MODE,
         debug=settings.DEBUG
     )
+    await check_body_signing()
+    await SessionRegistry.startup()
+    migrated = await AuthStateRepository.migrate_all(await RedisConnection.get_pool())
+    if migrated:
+        print(f"🔑 Migrated auth state of {migrated} users")
+    migrated = await ConversationHistoryManager().migrate_legacy_histories()
+    if migrated:
+        print(f"💬 Migrated {migrated} conversation histories")
+    TokenCache.start_listener()
+    TokenRefresher.start()
     print("🚀 Bot started with signature middleware")
 
 
@@ -29,8 +50,12 @@ async def shutdown():
     """
     Properly clean up resources when the bot is shutting down.
 
-    Uninstalls the signature middleware to prevent any lingering effects.
+    Stops the token refresh and invalidation tasks, closes the shared HTTP sessions and
+    uninstalls the signature middleware to prevent any lingering effects.
     """
+    await TokenRefresher.stop()
+    await TokenCache.stop_listener()
+    await SessionRegistry.shutdown()
     uninstall_signature_middleware()
     print("🛑 Bot stopped")
 
@@ -48,10 +73,11 @@ async def turn_i18n(dp: Dispatcher):
         domain="messages"
     )
 
-    # Set up the middleware
+    # Set up the middleware; as an outer middleware the locale is known to
+    # filters too, which match translated command names
     middleware = SimpleI18nMiddleware(i18n=i18n)
-    dp.message.middleware(middleware)
-    dp.callback_query.middleware(middleware)
+    dp.message.outer_middleware(middleware)
+    dp.callback_query.outer_middleware(middleware)
 
     print("🌐 Internationalization middleware installed")
 
@@ -73,7 +99,11 @@ async def main():
 
     # Set up middlewares
     await turn_i18n(dp)
-    dp.message.middleware(AuthMiddleware())
+    # Outer middlewares run before router filters, so filters such as
+    # IsStaff share the update's auth context with the handler
+    auth_middleware = AuthMiddleware()
+    dp.message.outer_middleware(auth_middleware)
+    dp.callback_query.outer_middleware(auth_middleware)
 
     dp.include_router(router)
 
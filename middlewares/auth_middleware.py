@@ -1,22 +1,30 @@
-from api.structure.models import User
-from routers.auth.utils.commons import get_auth_token
+from aiogram.types import User
+
+from api_client.auth_context import AuthContext, reset_auth_context, set_auth_context
 
 
 class AuthMiddleware:
     """
-    Middleware for checking authentication and adding auth headers.
-    If access token is missing but refresh token exists, it will try to refresh.
+    Middleware that sets up the auth context of the update's user.
+
+    Nothing is read from Redis here: the access token, refresh state and staff
+    flag are resolved on first use and memoized for the rest of the update.
+    API clients pick the context up to authenticate their requests; handlers
+    can also reach it as the ``auth`` argument.
     """
 
     @staticmethod
     async def __call__(handler, event, data):
-        # Extract telegram_id from the message
+        # Extract telegram_id from the message or callback query
         user = getattr(event, 'from_user', None)
-        if user and isinstance(user, User):
-            token = await get_auth_token(user.id)
-            if token:
-                # Add to middleware data to be used in API calls
-                data["auth_header"] = f"Bearer {token}"
+        if not (user and isinstance(user, User)):
+            return await handler(event, data)
 
-        # Continue processing
-        return await handler(event, data)
+        context = AuthContext(user.id)
+        data["auth"] = context
+        token = set_auth_context(context)
+        try:
+            # Continue processing
+            return await handler(event, data)
+        finally:
+            reset_auth_context(token)
@@ -1,26 +1,154 @@
 """
-Single aiohttp middleware that automatically signs ONLY backend requests
-Ignores Telegram API and other external requests
+Request signing for backend requests only.
+
+Signing is attached to the shared backend session through a custom
+``ClientRequest`` class, so Telegram and OpenRouter traffic never pass
+through it. Request bodies are fed to the hash chunk by chunk as they are
+serialized, so multipart uploads and files are never buffered in memory.
+
+Two body canonicalization modes are agreed with Django:
+    - ``raw``: the signed message is ``METHOD|path|<body bytes>|timestamp|nonce``
+    - ``digest``: the signed message is ``METHOD|path|<hex sha256 of body>|timestamp|nonce``
+      and the digest is also sent in the digest header, so the backend can
+      verify the body while streaming it instead of buffering it first
 """
+import asyncio
 import aiohttp
 import hmac
+import io
 import hashlib
 import time
 import uuid
 import json
 import logging
-from typing import Dict, Any, Optional, List, Union
+from typing import Dict, Any, Optional, List, Union, Tuple, Type
 from urllib.parse import urlparse
 
+from aiohttp import payload
+from aiohttp.multipart import MultipartPayloadWriter
+from yarl import URL
+
+from api_client.sessions import SessionRegistry, Upstream
+
 logger = logging.getLogger(__name__)
 
-# Store original methods
-_original_request = aiohttp.ClientSession._request
+# Size of the chunks read from file-like bodies while hashing
+_CHUNK_SIZE = 2 ** 16
+
+BODY_MODE_RAW = 'raw'
+BODY_MODE_DIGEST = 'digest'
+
+
+class _HashingWriter:
+    """Minimal stream writer that feeds everything written to it into a hash"""
+
+    def __init__(self, hasher):
+        self.hasher = hasher
+
+    async def write(self, chunk: bytes) -> None:
+        self.hasher.update(chunk)
+
+    async def write_eof(self, chunk: bytes = b"") -> None:
+        self.hasher.update(chunk)
+
+    async def drain(self) -> None:
+        pass
+
+
+async def _read_io_chunks(value: io.IOBase):
+    """
+    Yield the remaining content of a file-like object and rewind it afterwards,
+    so aiohttp can still send it from the same position
+    """
+    loop = asyncio.get_running_loop()
+    position = value.tell()
+    try:
+        while True:
+            if isinstance(value, io.BytesIO):
+                chunk = value.read(_CHUNK_SIZE)
+            else:
+                chunk = await loop.run_in_executor(None, value.read, _CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        value.seek(position)
+
+
+async def feed_body(body: Any, hasher) -> None:
+    """
+    Feed the exact bytes aiohttp will send for ``body`` into ``hasher``, chunk by chunk.
+
+    Supports in-memory payloads, seekable file payloads and multipart
+    writers (including FormData uploads). One-shot streaming payloads
+    cannot be replayed and raise ValueError.
+    """
+    if body is None:
+        return
+    if isinstance(body, (bytes, bytearray, memoryview)):
+        hasher.update(body)
+    elif isinstance(body, payload.BytesPayload):
+        hasher.update(body._value)
+    elif isinstance(body, aiohttp.MultipartWriter):
+        boundary = body._boundary
+        for part, encoding, te_encoding in body._parts:
+            hasher.update(b"--" + boundary + b"\r\n")
+            hasher.update(part._binary_headers)
+            if encoding or te_encoding:
+                if isinstance(part, payload.IOBasePayload):
+                    raise ValueError("Cannot sign encoded file parts without consuming them")
+                writer = MultipartPayloadWriter(_HashingWriter(hasher))
+                if encoding:
+                    writer.enable_compression(encoding)
+                if te_encoding:
+                    writer.enable_encoding(te_encoding)
+                await part.write(writer)
+                await writer.write_eof()
+            else:
+                await feed_body(part, hasher)
+            hasher.update(b"\r\n")
+        hasher.update(b"--" + boundary + b"--\r\n")
+    elif isinstance(body, payload.TextIOPayload):
+        async for chunk in _read_io_chunks(body._value):
+            hasher.update(chunk.encode(body.encoding or 'utf-8'))
+    elif isinstance(body, payload.IOBasePayload):
+        async for chunk in _read_io_chunks(body._value):
+            hasher.update(chunk)
+    else:
+        raise ValueError(f"Cannot sign request body of type {type(body).__name__}")
+
+
+async def check_body_signing() -> None:
+    """
+    Check that feed_body hashes a multipart body exactly as aiohttp writes it.
+
+    feed_body walks aiohttp's private multipart attributes, so an aiohttp
+    upgrade that changes them would silently break every signed upload.
+    Called at startup, so such an upgrade fails loudly instead.
+
+    Raises:
+        RuntimeError: If the signed bytes differ from the sent ones
+    """
+    with aiohttp.MultipartWriter("form-data") as body:
+        body.append("value", {"Content-Disposition": 'form-data; name="field"'})
+        body.append_json({"key": "value"})
+        body.append(io.BytesIO(b"file content"), {"Content-Type": "application/octet-stream"})
+
+    # feed_body rewinds file parts, while writing the body consumes them
+    expected, signed = hashlib.sha256(), hashlib.sha256()
+    try:
+        await feed_body(body, signed)
+    except (AttributeError, ValueError) as e:
+        raise RuntimeError(f"Request signing doesn't support aiohttp {aiohttp.__version__}: {e}") from e
+    await body.write(_HashingWriter(expected))
+    if signed.digest() != expected.digest():
+        raise RuntimeError(f"Request signing hashes multipart bodies differently "
+                           f"from how aiohttp {aiohttp.__version__} sends them")
 
 
 class SignatureMiddleware:
     """
-    Single middleware that automatically signs only specified backend requests
+    Signs requests made through the backend session with an HMAC signature
     """
 
     def __init__(self, secret_key: str,
@@ -29,6 +157,8 @@ class SignatureMiddleware:
                  signature_header: str = 'X-Signature',
                  timestamp_header: str = 'X-Timestamp',
                  nonce_header: str = 'X-Nonce',
+                 digest_header: str = 'X-Content-SHA256',
+                 body_mode: str = BODY_MODE_RAW,
                  debug: bool = False):
         """
         Initialize signature middleware
@@ -43,18 +173,24 @@ class SignatureMiddleware:
             signature_header: Header name for signature (default: X-Signature)
             timestamp_header: Header name for timestamp (default: X-Timestamp)
             nonce_header: Header name for nonce (default: X-Nonce)
+            digest_header: Header name for the body digest in digest mode (default: X-Content-SHA256)
+            body_mode: Body canonicalization, 'raw' or 'digest' (default: raw)
             debug: Enable debug logging (default: False)
         """
         if not secret_key:
             raise ValueError("Secret key is required")
         if not backend_urls:
             raise ValueError("Backend URLs are required")
+        if body_mode not in (BODY_MODE_RAW, BODY_MODE_DIGEST):
+            raise ValueError(f"Unknown body mode: {body_mode}")
 
         self.secret_key = secret_key
         self.validity_window = validity_window
         self.signature_header = signature_header
         self.timestamp_header = timestamp_header
         self.nonce_header = nonce_header
+        self.digest_header = digest_header
+        self.body_mode = body_mode
         self.debug = debug
 
         # Normalize backend URLs to a list
@@ -63,102 +199,145 @@ class SignatureMiddleware:
         else:
             self.backend_urls = list(backend_urls)
 
-        # Prepare URL patterns for matching
-        self.url_patterns = []
-        for url in self.backend_urls:
-            # Remove trailing slashes and store for matching
-            clean_url = url.rstrip('/')
-            self.url_patterns.append(clean_url)
+        # Precompile URL patterns into host -> [(scheme, port, path prefix)] for matching
+        self.url_patterns = self._compile_patterns(self.backend_urls)
+
+        # Keyed HMAC state, copied for every request instead of re-deriving the key
+        self._hmac = hmac.new(secret_key.encode('utf-8'), digestmod=hashlib.sha256)
+
+        self.request_class = self._build_request_class()
 
         if self.debug:
             logger.info(f"🔐 SignatureMiddleware initialized")
             logger.info(f"   Backend URLs: {self.backend_urls}")
             logger.info(f"   Validity window: {validity_window}s")
+            logger.info(f"   Body mode: {body_mode}")
 
-    def install(self):
-        """Install the middleware globally for ALL aiohttp sessions"""
-
-        async def signed_request(session_self, method: str, url, **kwargs):
-            """Replacement for aiohttp.ClientSession._request that adds signatures"""
+    @staticmethod
+    def _compile_patterns(backend_urls: List[str]) -> Dict[str, List[Tuple[Optional[str], Optional[int], str]]]:
+        """
+        Parse backend URLs once into a host-indexed lookup table.
+        Domain-only patterns match any scheme, port and path.
+        """
+        patterns: Dict[str, List[Tuple[Optional[str], Optional[int], str]]] = {}
+        for url in backend_urls:
+            url = url.strip().lower()
+            if url.startswith(('http://', 'https://')):
+                parsed = urlparse(url)
+                host = parsed.hostname or ''
+                scheme, port = parsed.scheme, parsed.port
+                prefix = parsed.path.rstrip('/')
+            else:
+                host, _, port_str = url.rstrip('/').partition(':')
+                scheme, port, prefix = None, int(port_str) if port_str else None, ''
+            patterns.setdefault(host, []).append((scheme, port, prefix))
+        return patterns
 
-            # Check if this URL should be signed
-            if self._should_sign_request(str(url)):
-                # Extract path from URL for signature
-                parsed_url = urlparse(str(url))
-                path = parsed_url.path or '/'
+    def _build_request_class(self) -> Type[aiohttp.ClientRequest]:
+        """
+        Build a ClientRequest subclass that signs every matching request it sends.
+        """
+        middleware = self
 
-                # Get body for signature
-                body = self._get_body_for_signature(kwargs)
+        class SignedClientRequest(aiohttp.ClientRequest):
+            async def send(self, conn):
+                if middleware._should_sign_request(self.url):
+                    signature_headers = await middleware._sign_request(self.method, self.url, self.body)
+                    self.headers.update(signature_headers)
 
-                # Generate signature headers
-                signature_headers = self._create_manual_signature(method, path, body)
+                    if middleware.debug:
+                        nonce_short = signature_headers[middleware.nonce_header][:8]
+                        logger.debug(f"🔐 Signing {self.method} {self.url.raw_path} (nonce: {nonce_short}...)")
+                elif middleware.debug:
+                    logger.debug(f"⏭️  Skipping signature for {self.method} {self.url.host}{self.url.raw_path}")
 
-                # Add signature headers to request
-                headers = kwargs.get('headers', {})
-                headers.update(signature_headers)
-                kwargs['headers'] = headers
+                return await super().send(conn)
 
-                if self.debug:
-                    nonce_short = signature_headers[self.nonce_header][:8]
-                    logger.debug(f"🔐 Auto-signing {method} {path} (nonce: {nonce_short}...)")
-            else:
-                if self.debug:
-                    parsed_url = urlparse(str(url))
-                    logger.debug(f"⏭️  Skipping signature for {method} {parsed_url.netloc}{parsed_url.path}")
+        return SignedClientRequest
 
-            # Call original request method
-            return await _original_request(session_self, method, url, **kwargs)
-
-        # Monkey patch aiohttp.ClientSession._request
-        aiohttp.ClientSession._request = signed_request
+    def install(self):
+        """Attach signing to the backend session"""
+        SessionRegistry.set_request_class(Upstream.BACKEND, self.request_class)
 
         if self.debug:
-            logger.info("✅ SignatureMiddleware installed globally")
+            logger.info("✅ SignatureMiddleware installed on the backend session")
 
     def uninstall(self):
-        """Restore original aiohttp behavior"""
-        aiohttp.ClientSession._request = _original_request
+        """Detach signing from the backend session"""
+        SessionRegistry.set_request_class(Upstream.BACKEND, None)
 
         if self.debug:
             logger.info("❌ SignatureMiddleware uninstalled")
 
-    def _should_sign_request(self, url: str) -> bool:
+    def _should_sign_request(self, url: Union[URL, str]) -> bool:
         """Check if this URL should be signed"""
-        parsed_url = urlparse(url)
-        request_host = parsed_url.netloc.lower()
-        request_url = f"{parsed_url.scheme}://{request_host}".rstrip('/')
+        if not isinstance(url, URL):
+            url = URL(url)
 
-        # Skip Telegram API requests
-        if 'api.telegram.org' in request_host:
+        candidates = self.url_patterns.get(url.host or '')
+        if not candidates:
             return False
 
-        # Check against our backend URLs
-        for pattern in self.url_patterns:
-            pattern_lower = pattern.lower()
-
-            # If pattern is just a domain (no protocol)
-            if not pattern_lower.startswith(('http://', 'https://')):
-                if pattern_lower in request_host:
-                    return True
-            else:
-                # Full URL matching
-                if request_url.startswith(pattern_lower):
-                    return True
-
-                # Also check if just the domain matches
-                pattern_parsed = urlparse(pattern_lower)
-                if pattern_parsed.netloc in request_host:
-                    return True
-
+        for scheme, port, prefix in candidates:
+            if scheme is not None and scheme != url.scheme:
+                continue
+            if port is not None and port != url.port:
+                continue
+            if url.raw_path.startswith(prefix):
+                return True
         return False
 
-    def _get_body_for_signature(self, kwargs) -> Any:
-        """Extract body from request kwargs"""
-        if 'json' in kwargs:
-            return kwargs['json']
-        elif 'data' in kwargs:
-            return kwargs['data']
-        return None
+    @staticmethod
+    def _get_body_bytes(body: Any) -> bytes:
+        """Extract the serialized bytes of a request body"""
+        if body is None:
+            return b""
+        if isinstance(body, (bytes, bytearray)):
+            return bytes(body)
+        if isinstance(body, payload.BytesPayload):
+            return bytes(body._value)
+        if isinstance(body, str):
+            return body.encode('utf-8')
+        if isinstance(body, dict):
+            return json.dumps(body, separators=(',', ':'), sort_keys=True, ensure_ascii=True).encode('utf-8')
+        return str(body).encode('utf-8')
+
+    async def _sign_request(self, method: str, url: URL, body: Any) -> Dict[str, str]:
+        """
+        Create signature headers for a request about to be sent,
+        streaming its body through the hash
+        """
+        timestamp = int(time.time())
+        nonce = str(uuid.uuid4())
+        path = url.raw_path or '/'
+
+        if self.body_mode == BODY_MODE_DIGEST:
+            digest = hashlib.sha256()
+            await feed_body(body, digest)
+            return self._sign_digest(method, path, digest.hexdigest(), timestamp, nonce)
+
+        signer = self._hmac.copy()
+        signer.update(f"{method.upper()}|{path}|".encode('utf-8'))
+        await feed_body(body, signer)
+        return self._finish_signature(signer, timestamp, nonce)
+
+    def _sign_digest(self, method: str, path: str, body_digest: str,
+                     timestamp: int, nonce: str) -> Dict[str, str]:
+        """Sign ``METHOD|path|body digest|timestamp|nonce`` and attach the digest header"""
+        signer = self._hmac.copy()
+        signer.update(f"{method.upper()}|{path}|{body_digest}".encode('utf-8'))
+        headers = self._finish_signature(signer, timestamp, nonce)
+        headers[self.digest_header] = body_digest
+        return headers
+
+    def _finish_signature(self, signer, timestamp: int, nonce: str) -> Dict[str, str]:
+        """Append ``|timestamp|nonce`` to a signer already fed with the method, path and body"""
+        signer.update(f"|{timestamp}|{nonce}".encode('utf-8'))
+        return {
+            self.signature_header: signer.hexdigest(),
+            self.timestamp_header: str(timestamp),
+            self.nonce_header: nonce
+        }
 
     def _create_manual_signature(self, method: str, path: str, body: Any = None,
                                 timestamp: int = None, nonce: str = None) -> Dict[str, str]:
@@ -171,31 +350,14 @@ class SignatureMiddleware:
         if nonce is None:
             nonce = str(uuid.uuid4())
 
-        # Normalize body - exactly matches Django implementation
-        body_str = ""
-        if body is not None:
-            if isinstance(body, dict):
-                body_str = json.dumps(body, separators=(',', ':'), sort_keys=True, ensure_ascii=True)
-            elif isinstance(body, str):
-                body_str = body
-            else:
-                body_str = str(body)
-
-        # Create message - exactly matches Django format
-        message = f"{method.upper()}|{path}|{body_str}|{timestamp}|{nonce}"
+        body_bytes = self._get_body_bytes(body)
+        if self.body_mode == BODY_MODE_DIGEST:
+            return self._sign_digest(method, path, hashlib.sha256(body_bytes).hexdigest(), timestamp, nonce)
 
-        # Calculate signature - exactly matches Django implementation
-        signature = hmac.new(
-            self.secret_key.encode('utf-8'),
-            message.encode('utf-8'),
-            hashlib.sha256
-        ).hexdigest()
-
-        return {
-            self.signature_header: signature,
-            self.timestamp_header: str(timestamp),
-            self.nonce_header: nonce
-        }
+        signer = self._hmac.copy()
+        signer.update(f"{method.upper()}|{path}|".encode('utf-8'))
+        signer.update(body_bytes)
+        return self._finish_signature(signer, timestamp, nonce)
 
 
 # Global middleware instance
@@ -208,10 +370,14 @@ def install_signature_middleware(secret_key: str,
                                signature_header: str = 'X-Signature',
                                timestamp_header: str = 'X-Timestamp',
                                nonce_header: str = 'X-Nonce',
+                               digest_header: str = 'X-Content-SHA256',
+                               body_mode: str = BODY_MODE_RAW,
                                debug: bool = False):
     """
     Install signature middleware for specific backend URLs only
 
+    Must be called before the backend session is opened.
+
     Args:
         secret_key: Secret key for HMAC signing (same as Django)
         backend_urls: URL(s) to sign requests for. Examples:
@@ -222,6 +388,8 @@ def install_signature_middleware(secret_key: str,
         signature_header: Header name for signature (default: X-Signature)
         timestamp_header: Header name for timestamp (default: X-Timestamp)
         nonce_header: Header name for nonce (default: X-Nonce)
+        digest_header: Header name for the body digest in digest mode (default: X-Content-SHA256)
+        body_mode: Body canonicalization, 'raw' or 'digest' (default: raw)
         debug: Enable debug logging (default: False)
     """
     global _middleware_instance
@@ -237,6 +405,8 @@ def install_signature_middleware(secret_key: str,
         signature_header=signature_header,
         timestamp_header=timestamp_header,
         nonce_header=nonce_header,
+        digest_header=digest_header,
+        body_mode=body_mode,
         debug=debug
     )
 
@@ -245,7 +415,7 @@ def install_signature_middleware(secret_key: str,
 
 
 def uninstall_signature_middleware():
-    """Uninstall signature middleware and restore original aiohttp behavior"""
+    """Uninstall signature middleware from the backend session"""
     global _middleware_instance
 
     if _middleware_instance:
@@ -258,4 +428,5 @@ def uninstall_signature_middleware():
 
 def is_middleware_installed() -> bool:
     """Check if signature middleware is currently installed"""
-    return _middleware_instance is not None
\ No newline at end of file
+    return _middleware_instance is not None
+
@@ -0,0 +1,92 @@
+import hashlib
+import logging
+import time
+from typing import Optional
+
+from redis.exceptions import RedisError
+
+from config import settings
+from redis_client.connection import RedisConnection
+from utils.text import normalize_text
+
+logger = logging.getLogger(__name__)
+
+ANSWER_CACHE_PREFIX = "llm:answer:"
+ANSWER_CACHE_STATS_KEY = "llm:answer_cache:stats"
+
+# Read an answer and count the hit or miss in one round trip, without
+# creating a counter-only hash for questions that aren't cached
+_GET_ANSWER_SCRIPT = """
+local answer = redis.call("hget", KEYS[1], "answer")
+if answer then
+    redis.call("hincrby", KEYS[1], "hits", 1)
+    redis.call("hincrby", KEYS[2], "hits", 1)
+else
+    redis.call("hincrby", KEYS[2], "misses", 1)
+end
+return answer
+"""
+
+
+class AnswerCache:
+    """
+    Caches AI answers to context-free questions, keyed by their normalized text.
+
+    Questions asked in different spellings of the same words (diacritics,
+    hamza forms, punctuation) share an entry. Each entry is a hash holding the
+    question, the answer and its hit count, and expires
+    ``LLM_ANSWER_CACHE_TTL`` seconds after it was stored. Hits and misses are
+    also counted globally.
+
+    The key includes a fingerprint of the system message, so changing the
+    assistant's instructions doesn't serve answers written under the old ones.
+    Cache errors are logged and treated as misses.
+    """
+
+    @staticmethod
+    def key(question: str, system_prompt: str) -> Optional[str]:
+        """
+        Get the cache key of a question, or None if it can't be cached.
+        """
+        normalized = normalize_text(question)
+        if not normalized or len(normalized) > settings.LLM_ANSWER_CACHE_MAX_QUESTION_LENGTH:
+            return None
+        digest = hashlib.sha256(f"{system_prompt}\0{normalized}".encode()).hexdigest()
+        return f"{ANSWER_CACHE_PREFIX}{digest}"
+
+    @classmethod
+    async def get(cls, question: str, system_prompt: str) -> Optional[str]:
+        """
+        Look up the cached answer to a question, counting the hit or miss.
+        """
+        key = cls.key(question, system_prompt)
+        if key is None:
+            return None
+        try:
+            pool = await RedisConnection.get_pool()
+            return await pool.eval(_GET_ANSWER_SCRIPT, 2, key, ANSWER_CACHE_STATS_KEY)
+        except RedisError as e:
+            logger.warning(f"Failed to read the answer cache: {str(e)}")
+            return None
+
+    @classmethod
+    async def set(cls, question: str, system_prompt: str, answer: str) -> None:
+        """
+        Store the answer to a question.
+        """
+        key = cls.key(question, system_prompt)
+        if key is None:
+            return
+        try:
+            pool = await RedisConnection.get_pool()
+            async with pool.pipeline(transaction=True) as pipe:
+                pipe.hset(key, mapping={
+                    "question": normalize_text(question),
+                    "answer": answer,
+                    "hits": 0,
+                    "created_at": time.time(),
+                })
+                pipe.expire(key, settings.LLM_ANSWER_CACHE_TTL)
+                await pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Failed to store an answer in the cache: {str(e)}")
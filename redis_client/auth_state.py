@@ -0,0 +1,194 @@
+import math
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from config import settings
+from redis_client.user_keys import UserKeyRegistry
+
+# Keys used before the auth state was consolidated into a hash
+LEGACY_ACCESS_PREFIX = "access_token:"
+LEGACY_REFRESH_PREFIX = "refresh_token:"
+LEGACY_IS_STAFF_PREFIX = "is_staff:"
+
+# Extend a key's expiry to ARGV[1] seconds, never shortening it; a key
+# without an expiry (TTL -1) gets one
+_EXTEND_EXPIRY_SCRIPT = """
+local ttl = redis.call("ttl", KEYS[1])
+if ttl < tonumber(ARGV[1]) then
+    redis.call("expire", KEYS[1], ARGV[1])
+end
+"""
+
+
+@dataclass
+class AuthState:
+    """
+    Snapshot of a user's auth state. Fields whose expiry has passed are None.
+    """
+    access: Optional[str] = None
+    access_expires_at: Optional[float] = None
+    refresh: Optional[str] = None
+    refresh_expires_at: Optional[float] = None
+    is_staff: Optional[bool] = None
+    is_staff_expires_at: Optional[float] = None
+
+    @property
+    def is_authenticated(self) -> bool:
+        return bool(self.access or self.refresh)
+
+    def access_ttl(self) -> float:
+        """
+        Seconds until the access token expires, 0 if there is none.
+        """
+        if not self.access or self.access_expires_at is None:
+            return 0.0
+        return max(self.access_expires_at - time.time(), 0.0)
+
+
+class AuthStateRepository:
+    """
+    Stores a user's tokens and staff status in a single Redis hash.
+
+    Each value is kept next to an ``<field>_exp`` timestamp, which gives the
+    hash field-level expiry without relying on HEXPIRE. The hash itself
+    expires once its longest-lived field can no longer be valid. Reads fetch
+    the whole state in one round trip. Users still stored under the legacy
+    per-value keys are migrated once, at startup (see migrate_all).
+    """
+
+    @staticmethod
+    def key(telegram_id) -> str:
+        """
+        Get the name of the hash holding a user's auth state.
+        """
+        return f"user:{telegram_id}:auth"
+
+    @staticmethod
+    def legacy_keys(telegram_id) -> tuple:
+        """
+        Get the pre-consolidation keys of a user, in access, refresh, is_staff order.
+        """
+        return (
+            f"{LEGACY_ACCESS_PREFIX}{telegram_id}",
+            f"{LEGACY_REFRESH_PREFIX}{telegram_id}",
+            f"{LEGACY_IS_STAFF_PREFIX}{telegram_id}",
+        )
+
+    @classmethod
+    async def get(cls, pool, telegram_id) -> AuthState:
+        """
+        Fetch a user's auth state in a single round trip.
+        """
+        return cls._parse(await pool.hgetall(cls.key(telegram_id)))
+
+    @staticmethod
+    def _parse(fields: Dict[str, str]) -> AuthState:
+        now = time.time()
+        state = AuthState()
+        for name in ("access", "refresh", "is_staff"):
+            value, expires_at = fields.get(name), fields.get(f"{name}_exp")
+            if value is None or expires_at is None or float(expires_at) <= now:
+                continue
+            setattr(state, name, value == "True" if name == "is_staff" else value)
+            setattr(state, f"{name}_expires_at", float(expires_at))
+        return state
+
+    @classmethod
+    def stage_tokens(cls, pipe, telegram_id, access: Optional[str] = None, refresh: Optional[str] = None,
+                     access_expires_at: Optional[float] = None,
+                     refresh_expires_at: Optional[float] = None) -> None:
+        """
+        Queue storing the user's tokens on a pipeline.
+
+        Tokens expire at the given timestamps, or after their configured
+        lifetimes when the expiry is unknown.
+        """
+        now = time.time()
+        mapping = {}
+        lifetime = settings.REFRESH_TOKEN_LIFETIME
+        if access:
+            access_expires_at = access_expires_at or now + settings.ACCESS_TOKEN_LIFETIME
+            mapping.update(access=access, access_exp=access_expires_at)
+            lifetime = max(lifetime, access_expires_at - now)
+        if refresh:
+            refresh_expires_at = refresh_expires_at or now + settings.REFRESH_TOKEN_LIFETIME
+            mapping.update(refresh=refresh, refresh_exp=refresh_expires_at)
+            lifetime = max(lifetime, refresh_expires_at - now)
+        if mapping:
+            cls._stage_fields(pipe, telegram_id, mapping, lifetime)
+
+    @classmethod
+    def stage_is_staff(cls, pipe, telegram_id, is_staff: bool, timeout: int) -> None:
+        """
+        Queue caching the user's staff status for ``timeout`` seconds on a pipeline.
+        """
+        cls._stage_fields(
+            pipe, telegram_id, {"is_staff": str(is_staff), "is_staff_exp": time.time() + timeout}, timeout
+        )
+
+    @classmethod
+    async def set_is_staff(cls, pool, telegram_id, is_staff: bool, timeout: int) -> None:
+        async with pool.pipeline(transaction=True) as pipe:
+            cls.stage_is_staff(pipe, telegram_id, is_staff, timeout)
+            await pipe.execute()
+
+    @classmethod
+    def _stage_fields(cls, pipe, telegram_id, mapping: Dict[str, object], lifetime: int) -> None:
+        key = cls.key(telegram_id)
+        pipe.hset(key, mapping=mapping)
+        # Fields carry their own expiry; the hash only has to outlive the longest
+        # one, so a short-lived field never cuts the lifetime of the tokens
+        pipe.eval(_EXTEND_EXPIRY_SCRIPT, 1, key, math.ceil(lifetime))
+        UserKeyRegistry.register(pipe, telegram_id, key)
+
+    @classmethod
+    async def _migrate(cls, pool, telegram_id) -> None:
+        """
+        Move a user's legacy keys into the hash, keeping their remaining lifetimes.
+        A user who already has a hash only has the legacy keys removed.
+        """
+        legacy_keys = cls.legacy_keys(telegram_id)
+        async with pool.pipeline(transaction=False) as pipe:
+            pipe.exists(cls.key(telegram_id))
+            pipe.mget(*legacy_keys)
+            for legacy_key in legacy_keys:
+                pipe.ttl(legacy_key)
+            has_state, values, *ttls = await pipe.execute()
+        if has_state:
+            values = (None,) * len(legacy_keys)
+
+        now = time.time()
+        mapping = {}
+        lifetime = 0
+        for name, value, ttl in zip(("access", "refresh", "is_staff"), values, ttls):
+            # A missing expiry (-1) falls back to the field's configured lifetime
+            if value is None or ttl == -2:
+                continue
+            if ttl < 0:
+                ttl = settings.REFRESH_TOKEN_LIFETIME if name == "refresh" else settings.ACCESS_TOKEN_LIFETIME
+            mapping.update({name: value, f"{name}_exp": now + ttl})
+            lifetime = max(lifetime, ttl)
+
+        async with pool.pipeline(transaction=True) as pipe:
+            if mapping:
+                cls._stage_fields(pipe, telegram_id, mapping, lifetime)
+            pipe.delete(*legacy_keys)
+            await pipe.execute()
+
+    @classmethod
+    async def migrate_all(cls, pool) -> int:
+        """
+        Migrate every user still stored under the legacy keys. Run at startup;
+        once no legacy keys are left it costs a scan per prefix.
+
+        Returns:
+            Number of users migrated.
+        """
+        telegram_ids = set()
+        for prefix in (LEGACY_ACCESS_PREFIX, LEGACY_REFRESH_PREFIX, LEGACY_IS_STAFF_PREFIX):
+            async for legacy_key in pool.scan_iter(match=f"{prefix}*"):
+                telegram_ids.add(legacy_key[len(prefix):])
+        for telegram_id in telegram_ids:
+            await cls._migrate(pool, telegram_id)
+        return len(telegram_ids)
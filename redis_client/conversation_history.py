@@ -1,68 +1,215 @@
 import json
-from typing import List, Dict, Any, Optional
+import time
+from typing import Any, List, Dict, Optional, Tuple
+
+from config import settings
 from redis_client.connection import RedisConnection
+from redis_client.user_keys import UserKeyRegistry
+
+# JSON-encoded list each history was stored under before histories became lists
+LEGACY_HISTORY_KEY_PATTERN = "user:*:conversation_history"
+
+# Remove up to ARGV[2] messages folded into the summary from the head of the
+# history: those stamped up to ARGV[1], and older ones stored without a stamp.
+# Stamps are compared as digit strings, since nanoseconds don't fit a Lua number,
+# and messages another node already removed aren't counted twice.
+_TRIM_FOLDED_SCRIPT = """
+local through = ARGV[1]
+local removed = 0
+while removed < tonumber(ARGV[2]) do
+    local head = redis.call("lindex", KEYS[1], 0)
+    if not head then
+        break
+    end
+    local ts = string.match(head, '"ts": (%d+)}$')
+    if ts and (#ts > #through or (#ts == #through and ts > through)) then
+        break
+    end
+    redis.call("lpop", KEYS[1])
+    removed = removed + 1
+end
+return removed
+"""
 
 
 class ConversationHistoryManager:
-    """Manages user conversation history with the AI assistant using Redis"""
+    """Manages user conversation history with the AI assistant using Redis
+
+    Messages are kept in a Redis list, so appending is O(1) and atomic:
+    each append pushes, trims and refreshes the expiry in one MULTI block.
+    The system message is not part of the list; a per-user override can be
+    stored next to it, along with a rolling summary of the turns that no
+    longer fit in the prompt, and both are fetched in the same round trip.
+    Every stored message carries a ``ts`` nanosecond timestamp so the
+    summary can record how far it reaches. Messages are removed from the
+    list once they are folded into the summary, so its length follows the
+    prompt's token budget; ``max_history_length`` only caps runaway lists.
+    Histories still stored under the legacy JSON key are converted once, at
+    startup (see migrate_legacy_histories).
+    """
 
-    def __init__(self, max_history_length: int = 10):
+    # Expiry of the conversation history (7 days)
+    HISTORY_TTL = 60 * 60 * 24 * 7
+
+    def __init__(self, max_history_length: int = settings.CONVERSATION_MAX_MESSAGES):
         """Initialize with a maximum number of messages to keep in history"""
         self.max_history_length = max_history_length
 
-    async def get_conversation_history(self, user_id: int) -> List[Dict[str, str]]:
-        """Retrieve the conversation history for a specific user"""
-        pool = await RedisConnection.get_pool()
-        history_key = f"user:{user_id}:conversation_history"
+    @staticmethod
+    def _history_key(user_id: int) -> str:
+        return f"user:{user_id}:conversation"
+
+    @staticmethod
+    def _system_key(user_id: int) -> str:
+        return f"user:{user_id}:conversation_system"
 
-        # Get the history from Redis
-        history_json = await pool.get(history_key)
-        if not history_json:
-            return []
+    @staticmethod
+    def _summary_key(user_id: int) -> str:
+        return f"user:{user_id}:conversation_summary"
 
+    @staticmethod
+    def _decode(raw: Optional[str]) -> Optional[Dict[str, str]]:
+        if not raw:
+            return None
         try:
-            return json.loads(history_json)
+            return json.loads(raw)
         except json.JSONDecodeError:
-            return []
+            return None
+
+    async def get_conversation(self, user_id: int) -> Tuple[Optional[Dict[str, str]], Optional[Dict[str, Any]],
+                                                            List[Dict[str, Any]]]:
+        """Retrieve the user's system message override, summary and message history in one round trip
+
+        Returns:
+            Tuple of (system message or None, summary or None, messages oldest first).
+            The summary is a dict with its ``content`` and the ``through`` timestamp
+            of the newest message folded into it.
+        """
+        pool = await RedisConnection.get_pool()
+        async with pool.pipeline(transaction=False) as pipe:
+            pipe.get(self._system_key(user_id))
+            pipe.get(self._summary_key(user_id))
+            pipe.lrange(self._history_key(user_id), -self.max_history_length, -1)
+            system_raw, summary_raw, history_raw = await pipe.execute()
+
+        history = [message for message in map(self._decode, history_raw) if message is not None]
+        return self._decode(system_raw), self._decode(summary_raw), history
+
+    async def get_conversation_history(self, user_id: int) -> List[Dict[str, str]]:
+        """Retrieve the conversation history for a specific user, system message first if one is stored"""
+        system_message, _, history = await self.get_conversation(user_id)
+        return [system_message, *history] if system_message else history
+
+    async def add_messages(self, user_id: int, *messages: Dict[str, str]) -> None:
+        """Append messages to the user's conversation history atomically
+
+        Messages appended together stay adjacent even when the user has
+        several turns in flight.
+
+        Args:
+            user_id: The telegram user ID
+            messages: Dictionaries with 'role' and 'content' keys
+        """
+        if not messages:
+            return
+        pool = await RedisConnection.get_pool()
+        history_key = self._history_key(user_id)
+
+        # Push, trim to max length and refresh the expiry in one transaction,
+        # indexed for cleanup on logout
+        async with pool.pipeline(transaction=True) as pipe:
+            now = time.time_ns()
+            pipe.rpush(history_key, *(
+                json.dumps({**message, "ts": now + offset}, ensure_ascii=False)
+                for offset, message in enumerate(messages)
+            ))
+            pipe.ltrim(history_key, -self.max_history_length, -1)
+            pipe.expire(history_key, self.HISTORY_TTL)
+            UserKeyRegistry.register(pipe, user_id, history_key)
+            await pipe.execute()
 
     async def add_message(self, user_id: int, message: Dict[str, str]) -> None:
         """Add a message to the user's conversation history
 
+        A system message replaces the user's system message instead of being appended.
+
         Args:
             user_id: The telegram user ID
             message: Dictionary with 'role' and 'content' keys
         """
+        if message.get("role") == "system":
+            await self.set_system_message(user_id, message)
+        else:
+            await self.add_messages(user_id, message)
+
+    async def set_system_message(self, user_id: int, message: Dict[str, str]) -> None:
+        """Store a system message used for this user instead of the default one"""
         pool = await RedisConnection.get_pool()
-        history_key = f"user:{user_id}:conversation_history"
+        system_key = self._system_key(user_id)
+        async with pool.pipeline(transaction=True) as pipe:
+            pipe.set(system_key, json.dumps(message, ensure_ascii=False), ex=self.HISTORY_TTL)
+            UserKeyRegistry.register(pipe, user_id, system_key)
+            await pipe.execute()
 
-        # Get existing history
-        history = await self.get_conversation_history(user_id)
+    async def set_summary(self, user_id: int, content: str, through: int, folded: int) -> None:
+        """Store the rolling summary of the messages up to and including the ``through`` timestamp
 
-        # Add new message and trim to max length
-        history.append(message)
-        if len(history) > self.max_history_length:
-            # Keep system message if it exists at the beginning,
-            # then the most recent messages up to max_history_length
-            system_message = None
-            if history and history[0]["role"] == "system":
-                system_message = history[0]
-                history = history[1:]
+        The ``folded`` oldest messages it covers are removed from the history in the same transaction.
+        """
+        pool = await RedisConnection.get_pool()
+        summary_key = self._summary_key(user_id)
+        async with pool.pipeline(transaction=True) as pipe:
+            pipe.set(summary_key, json.dumps({"content": content, "through": through}, ensure_ascii=False),
+                     ex=self.HISTORY_TTL)
+            pipe.eval(_TRIM_FOLDED_SCRIPT, 1, self._history_key(user_id), through, folded)
+            UserKeyRegistry.register(pipe, user_id, summary_key)
+            await pipe.execute()
 
-            # Trim the history
-            history = history[-(self.max_history_length - (1 if system_message else 0)):]
+    async def migrate_legacy_histories(self) -> int:
+        """Convert every history still stored as a JSON-encoded list into the list layout
 
-            # Add system message back if it existed
-            if system_message:
-                history = [system_message] + history
+        Each history keeps its remaining expiry. Its messages have no ``ts``
+        and are treated as older than any stamped one. The leading system
+        message is dropped, since it was always the client's default prompt.
+        A user who already has a list only has the legacy key removed.
+
+        Returns:
+            Number of histories converted.
+        """
+        pool = await RedisConnection.get_pool()
+        migrated = 0
+        async for legacy_key in pool.scan_iter(match=LEGACY_HISTORY_KEY_PATTERN):
+            user_id = legacy_key.split(":")[1]
+            history_key = self._history_key(user_id)
+            async with pool.pipeline(transaction=False) as pipe:
+                pipe.get(legacy_key)
+                pipe.ttl(legacy_key)
+                pipe.exists(history_key)
+                raw, ttl, has_history = await pipe.execute()
 
-        # Save updated history
-        await pool.set(history_key, json.dumps(history))
+            try:
+                messages = json.loads(raw) if raw and not has_history else []
+            except json.JSONDecodeError:
+                messages = []
+            messages = [m for m in messages if isinstance(m, dict) and m.get("role") in ("user", "assistant")]
+            ttl = ttl if ttl > 0 else self.HISTORY_TTL
 
-        # Set expiry for the conversation history (7 days)
-        await pool.expire(history_key, 60 * 60 * 24 * 7)
+            async with pool.pipeline(transaction=True) as pipe:
+                if messages:
+                    pipe.rpush(history_key, *(json.dumps(m, ensure_ascii=False) for m in messages))
+                    pipe.ltrim(history_key, -self.max_history_length, -1)
+                    pipe.expire(history_key, ttl)
+                    UserKeyRegistry.register(pipe, user_id, history_key)
+                pipe.delete(legacy_key)
+                await pipe.execute()
+            migrated += bool(messages)
+        return migrated
 
     async def clear_history(self, user_id: int) -> None:
         """Clear the conversation history for a user"""
         pool = await RedisConnection.get_pool()
-        history_key = f"user:{user_id}:conversation_history"
-        await pool.delete(history_key)
+        # The JSON-encoded key used before histories became lists is removed as well
+        await pool.delete(
+            self._history_key(user_id), self._system_key(user_id), self._summary_key(user_id),
+            f"user:{user_id}:conversation_history"
+        )
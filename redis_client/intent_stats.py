@@ -0,0 +1,46 @@
+import logging
+from typing import Dict, Optional
+
+from redis.exceptions import RedisError
+
+from redis_client.connection import RedisConnection
+
+logger = logging.getLogger(__name__)
+
+INTENT_STATS_KEY = "intents:stats"
+
+
+class IntentStats:
+    """
+    Counts how free-text messages were answered, to measure how many the
+    local intent router keeps away from the AI assistant.
+
+    The counters live in one Redis hash: ``messages`` counts every message,
+    ``assistant`` those passed to the AI assistant and ``intent:<name>``
+    those answered locally, per intent.
+    """
+
+    @staticmethod
+    async def record(intent: Optional[str]) -> None:
+        """
+        Count a message, answered locally for the given intent or by the assistant if None.
+        """
+        try:
+            pool = await RedisConnection.get_pool()
+            async with pool.pipeline(transaction=True) as pipe:
+                pipe.hincrby(INTENT_STATS_KEY, "messages", 1)
+                pipe.hincrby(INTENT_STATS_KEY, f"intent:{intent}" if intent else "assistant", 1)
+                await pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Failed to record intent statistics: {str(e)}")
+
+    @staticmethod
+    async def get() -> Dict[str, float]:
+        """
+        Get the counters, along with ``answered_locally``, the share of messages not sent to the assistant.
+        """
+        pool = await RedisConnection.get_pool()
+        stats = {name: int(count) for name, count in (await pool.hgetall(INTENT_STATS_KEY)).items()}
+        messages = stats.get("messages", 0)
+        stats["answered_locally"] = (messages - stats.get("assistant", 0)) / messages if messages else 0.0
+        return stats
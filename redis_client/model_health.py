@@ -0,0 +1,258 @@
+import logging
+import math
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+from redis.exceptions import RedisError
+
+from config import settings
+from redis_client.connection import RedisConnection
+
+logger = logging.getLogger(__name__)
+
+MODEL_HEALTH_PREFIX = "llm:model:"
+# Statistics of models that stop being used expire after a day
+HEALTH_TTL = 60 * 60 * 24
+
+# Count a failure and open the circuit once the model has failed enough times
+# in a row, atomically so that every node agrees on when the model was ejected
+_RECORD_FAILURE_SCRIPT = """
+redis.call("lpush", KEYS[2], "0")
+redis.call("ltrim", KEYS[2], 0, tonumber(ARGV[4]) - 1)
+redis.call("expire", KEYS[2], ARGV[5])
+local consecutive = redis.call("hincrby", KEYS[1], "consecutive_failures", 1)
+redis.call("hset", KEYS[1], "last_error", ARGV[1], "last_error_at", ARGV[2], "updated_at", ARGV[2])
+if consecutive >= tonumber(ARGV[3]) then
+    redis.call("hset", KEYS[1], "opened_until", ARGV[6])
+end
+redis.call("expire", KEYS[1], ARGV[5])
+return consecutive
+"""
+
+
+def _percentile(samples: List[float], percent: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[max(math.ceil(percent / 100 * len(ordered)) - 1, 0)]
+
+
+@dataclass
+class ModelHealth:
+    """
+    Recent statistics of a model, shared by every node.
+
+    ``success_rate`` and the latency percentiles cover the last
+    ``LLM_HEALTH_WINDOW`` calls. The circuit is open while ``opened_until``
+    lies in the future, and half-open once it has passed but the model
+    hasn't succeeded since.
+    """
+    model: str
+    calls: int = 0
+    latency_samples: int = 0
+    success_rate: Optional[float] = None
+    p50: Optional[float] = None
+    p95: Optional[float] = None
+    consecutive_failures: int = 0
+    last_error: Optional[str] = None
+    last_error_at: Optional[float] = None
+    opened_until: Optional[float] = None
+    updated_at: Optional[float] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_until is not None and self.opened_until > time.time()
+
+    @property
+    def is_half_open(self) -> bool:
+        return self.opened_until is not None and not self.is_open
+
+    @property
+    def is_degraded(self) -> bool:
+        """
+        Whether the model should be tried after healthy ones: it failed its
+        last call, fails too often, or is usually slow enough to be hedged.
+        """
+        if self.consecutive_failures:
+            return True
+        if self.calls >= settings.LLM_HEALTH_MIN_SAMPLES and self.success_rate < settings.LLM_HEALTH_MIN_SUCCESS_RATE:
+            return True
+        # Latencies are times to the first token when streaming, and to the whole answer otherwise
+        hedge_delay = settings.LLM_HEDGE_DELAY if settings.LLM_STREAMING else settings.LLM_COMPLETION_HEDGE_DELAY
+        return self.latency_samples >= settings.LLM_HEALTH_MIN_SAMPLES and self.p95 > hedge_delay
+
+    @property
+    def needs_probe(self) -> bool:
+        """
+        Whether the model should be given another chance: its cooldown is
+        over, or it has been degraded without being called for as long.
+        """
+        if self.is_half_open:
+            return True
+        return (self.is_degraded and self.updated_at is not None
+                and self.updated_at + settings.LLM_BREAKER_COOLDOWN <= time.time())
+
+    @property
+    def expected_latency(self) -> float:
+        """
+        Typical time to get an answer from the model, counting retries on failure.
+        """
+        if not self.p50 or not self.success_rate:
+            return math.inf
+        return self.p50 / self.success_rate
+
+
+class ModelHealthTracker:
+    """
+    Tracks the latency and errors of LLM models in Redis and orders models by health.
+
+    Each model has a hash of counters, a capped list of recent outcomes and
+    a capped list of recent latencies. A model that fails
+    ``LLM_BREAKER_FAILURE_THRESHOLD`` times in a row is ejected for
+    ``LLM_BREAKER_COOLDOWN`` seconds; after that a single request, on
+    whichever node claims the probe first, tries it again. A success closes
+    the circuit, a failure ejects the model for another cooldown.
+
+    Health is advisory: when Redis is unavailable models are used in their
+    configured order.
+    """
+
+    @staticmethod
+    def _key(model: str, kind: str) -> str:
+        return f"{MODEL_HEALTH_PREFIX}{model}:{kind}"
+
+    @classmethod
+    async def get(cls, models: List[str]) -> List[ModelHealth]:
+        """
+        Fetch the health of several models in one round trip.
+        """
+        pool = await RedisConnection.get_pool()
+        async with pool.pipeline(transaction=False) as pipe:
+            for model in models:
+                pipe.hgetall(cls._key(model, "health"))
+                pipe.lrange(cls._key(model, "outcomes"), 0, -1)
+                pipe.lrange(cls._key(model, "latencies"), 0, -1)
+            results = await pipe.execute()
+
+        healths = []
+        for index, model in enumerate(models):
+            fields, outcomes, latencies = results[index * 3:index * 3 + 3]
+            samples = [float(latency) for latency in latencies]
+            healths.append(ModelHealth(
+                model=model,
+                calls=len(outcomes),
+                latency_samples=len(samples),
+                success_rate=outcomes.count("1") / len(outcomes) if outcomes else None,
+                p50=_percentile(samples, 50),
+                p95=_percentile(samples, 95),
+                consecutive_failures=int(fields.get("consecutive_failures", 0)),
+                last_error=fields.get("last_error"),
+                last_error_at=float(fields["last_error_at"]) if "last_error_at" in fields else None,
+                opened_until=float(fields["opened_until"]) if "opened_until" in fields else None,
+                updated_at=float(fields["updated_at"]) if "updated_at" in fields else None,
+            ))
+        return healths
+
+    @classmethod
+    async def rank(cls, models: List[str]) -> List[str]:
+        """
+        Order models for a request.
+
+        Healthy models keep their configured order, followed by degraded
+        ones, fastest first. Ejected models are left out. Once a cooldown has
+        passed since an ejected or degraded model was last called, the one
+        request that claims its probe tries it in its configured place again.
+        If every model is ejected, all of them are returned in configured order.
+        """
+        try:
+            healths = await cls.get(models)
+            probes = [health.model for health in healths if health.needs_probe]
+            claimed = set()
+            if probes:
+                pool = await RedisConnection.get_pool()
+                async with pool.pipeline(transaction=False) as pipe:
+                    for model in probes:
+                        pipe.set(cls._key(model, "probe"), "1", nx=True, ex=math.ceil(settings.LLM_BREAKER_COOLDOWN))
+                    claimed = {model for model, acquired in zip(probes, await pipe.execute()) if acquired}
+        except RedisError as e:
+            logger.warning(f"Failed to read model health, using configured order: {str(e)}")
+            return list(models)
+
+        available = [
+            (index, health) for index, health in enumerate(healths)
+            if health.opened_until is None or health.model in claimed
+        ]
+        if not available:
+            return list(models)
+
+        ranked = sorted(available, key=lambda item: (
+            (True, item[1].expected_latency, item[0])
+            if item[1].is_degraded and item[1].model not in claimed else (False, 0.0, item[0])
+        ))
+        if claimed:
+            logger.info(f"Probing models: {', '.join(sorted(claimed))}")
+        return [health.model for _, health in ranked]
+
+    @classmethod
+    async def record_success(cls, model: str, latency: float) -> None:
+        """
+        Record a successful call and close the model's circuit.
+        """
+        try:
+            pool = await RedisConnection.get_pool()
+            async with pool.pipeline(transaction=True) as pipe:
+                cls._push(pipe, cls._key(model, "outcomes"), "1")
+                cls._push(pipe, cls._key(model, "latencies"), f"{latency:.3f}")
+                health_key = cls._key(model, "health")
+                pipe.hset(health_key, mapping={"consecutive_failures": 0, "updated_at": time.time()})
+                pipe.hdel(health_key, "opened_until")
+                pipe.expire(health_key, HEALTH_TTL)
+                pipe.delete(cls._key(model, "probe"))
+                await pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Failed to record success of {model}: {str(e)}")
+
+    @classmethod
+    async def record_failure(cls, model: str, error: str) -> None:
+        """
+        Record a failed call, ejecting the model once it failed too many times in a row.
+        """
+        now = time.time()
+        try:
+            pool = await RedisConnection.get_pool()
+            consecutive = await pool.eval(
+                _RECORD_FAILURE_SCRIPT, 2, cls._key(model, "health"), cls._key(model, "outcomes"),
+                error[:500], now, settings.LLM_BREAKER_FAILURE_THRESHOLD, settings.LLM_HEALTH_WINDOW,
+                HEALTH_TTL, now + settings.LLM_BREAKER_COOLDOWN,
+            )
+        except RedisError as e:
+            logger.warning(f"Failed to record failure of {model}: {str(e)}")
+            return
+        if consecutive == settings.LLM_BREAKER_FAILURE_THRESHOLD:
+            logger.warning(f"Ejecting model {model} for {settings.LLM_BREAKER_COOLDOWN}s "
+                           f"after {consecutive} consecutive failures: {error}")
+
+    @classmethod
+    async def record_latency(cls, model: str, latency: float) -> None:
+        """
+        Record how long an unfinished call had been running when it was abandoned.
+
+        The sample is a lower bound of the model's latency; it doesn't count as
+        a success or a failure, but keeps a model that hangs from looking fast.
+        """
+        try:
+            pool = await RedisConnection.get_pool()
+            async with pool.pipeline(transaction=False) as pipe:
+                cls._push(pipe, cls._key(model, "latencies"), f"{latency:.3f}")
+                pipe.hset(cls._key(model, "health"), "updated_at", time.time())
+                pipe.expire(cls._key(model, "health"), HEALTH_TTL)
+                await pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Failed to record latency of {model}: {str(e)}")
+
+    @staticmethod
+    def _push(pipe, key: str, value: str) -> None:
+        pipe.lpush(key, value)
+        pipe.ltrim(key, 0, settings.LLM_HEALTH_WINDOW - 1)
+        pipe.expire(key, HEALTH_TTL)
@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from redis.exceptions import RedisError
+
+from config import settings
+from redis_client.connection import RedisConnection
+
+logger = logging.getLogger(__name__)
+
+
+class TokenCache:
+    """
+    In-process TTL cache of access tokens and staff status keyed by telegram id.
+
+    Sits in front of Redis so that active users don't pay a Redis round trip
+    on every update. Token entries never outlive the token's remaining lifetime
+    in Redis, and users without a token are cached briefly as negative entries.
+    Whenever a user's tokens change, every node is told to drop both entries
+    through Redis pub/sub.
+
+    Attributes:
+        CHANNEL: Pub/sub channel carrying the telegram ids to invalidate
+        _entries: Cached tokens keyed by telegram id, with their monotonic expiry
+        _staff: Cached staff status keyed by telegram id, with its monotonic expiry
+        _listener_task: Background task consuming invalidation messages
+    """
+    CHANNEL = "auth:token_invalidation"
+
+    _entries: "OrderedDict[str, Tuple[Optional[str], float]]" = OrderedDict()
+    _staff: "OrderedDict[str, Tuple[bool, float]]" = OrderedDict()
+    _listener_task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def get(cls, telegram_id) -> Tuple[bool, Optional[str]]:
+        """
+        Look up a cached token.
+
+        Returns:
+            Tuple of (hit, token); token is None for a cached negative entry.
+        """
+        key = str(telegram_id)
+        entry = cls._entries.get(key)
+        if entry is None:
+            return False, None
+        token, expires_at = entry
+        if expires_at <= time.monotonic():
+            cls._entries.pop(key, None)
+            return False, None
+        cls._entries.move_to_end(key)
+        return True, token
+
+    @classmethod
+    def set(cls, telegram_id, token: Optional[str], ttl: float) -> None:
+        """
+        Cache a token (or its absence) for at most ``ttl`` seconds.
+        """
+        if token is None:
+            ttl = min(ttl, settings.TOKEN_CACHE_NEGATIVE_TTL)
+        ttl = min(ttl, settings.TOKEN_CACHE_MAX_TTL)
+        if ttl <= 0:
+            return
+        key = str(telegram_id)
+        cls._entries[key] = (token, time.monotonic() + ttl)
+        cls._entries.move_to_end(key)
+        while len(cls._entries) > settings.TOKEN_CACHE_MAX_SIZE:
+            cls._entries.popitem(last=False)
+
+    @classmethod
+    def get_staff(cls, telegram_id) -> Tuple[bool, Optional[bool]]:
+        """
+        Look up a cached staff status.
+
+        Returns:
+            Tuple of (hit, is_staff).
+        """
+        key = str(telegram_id)
+        entry = cls._staff.get(key)
+        if entry is None:
+            return False, None
+        is_staff, expires_at = entry
+        if expires_at <= time.monotonic():
+            cls._staff.pop(key, None)
+            return False, None
+        return True, is_staff
+
+    @classmethod
+    def set_staff(cls, telegram_id, is_staff: bool) -> None:
+        """
+        Cache a staff status; denials are kept for a shorter time than grants.
+        """
+        ttl = settings.STAFF_CACHE_TTL if is_staff else settings.STAFF_CACHE_NEGATIVE_TTL
+        key = str(telegram_id)
+        cls._staff[key] = (is_staff, time.monotonic() + ttl)
+        cls._staff.move_to_end(key)
+        while len(cls._staff) > settings.TOKEN_CACHE_MAX_SIZE:
+            cls._staff.popitem(last=False)
+
+    @classmethod
+    def discard(cls, telegram_id) -> None:
+        """
+        Drop a user's cached token and staff status on this node only.
+        """
+        cls._entries.pop(str(telegram_id), None)
+        cls._staff.pop(str(telegram_id), None)
+
+    @classmethod
+    async def invalidate(cls, telegram_id) -> None:
+        """
+        Drop a user's cached token on every node.
+        """
+        cls.discard(telegram_id)
+        try:
+            pool = await RedisConnection.get_pool()
+            await pool.publish(cls.CHANNEL, str(telegram_id))
+        except RedisError as e:
+            logger.warning(f"Failed to publish token invalidation for {telegram_id}: {e}")
+
+    @classmethod
+    async def _listen(cls) -> None:
+        """
+        Consume invalidation messages, reconnecting after Redis failures.
+        """
+        while True:
+            try:
+                pool = await RedisConnection.get_pool()
+                async with pool.pubsub() as pubsub:
+                    await pubsub.subscribe(cls.CHANNEL)
+                    # Anything cached before the subscription may have missed invalidations
+                    cls.clear()
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            cls.discard(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except RedisError as e:
+                logger.warning(f"Token invalidation listener disconnected: {e}")
+                cls.clear()
+                await asyncio.sleep(1)
+
+    @classmethod
+    def start_listener(cls) -> None:
+        """
+        Start consuming invalidation messages in the background.
+        """
+        if cls._listener_task is None or cls._listener_task.done():
+            cls._listener_task = asyncio.create_task(cls._listen())
+
+    @classmethod
+    async def stop_listener(cls) -> None:
+        """
+        Stop the background listener and forget every cached entry.
+        """
+        if cls._listener_task is not None:
+            cls._listener_task.cancel()
+            try:
+                await cls._listener_task
+            except asyncio.CancelledError:
+                pass
+            cls._listener_task = None
+        cls.clear()
+
+    @classmethod
+    def clear(cls) -> None:
+        cls._entries.clear()
+        cls._staff.clear()
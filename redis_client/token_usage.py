@@ -0,0 +1,157 @@
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from redis.exceptions import RedisError
+
+from config import settings
+from redis_client.connection import RedisConnection
+
+logger = logging.getLogger(__name__)
+
+TOKEN_USAGE_PREFIX = "llm:usage:"
+# Usage windows: name, strftime format of the window id and how long its counters are kept
+DAY = ("day", "%Y-%m-%d", 60 * 60 * 24 * 8)
+MONTH = ("month", "%Y-%m", 60 * 60 * 24 * 400)
+WINDOWS = (DAY, MONTH)
+
+
+@dataclass
+class UsageReport:
+    """
+    Tokens used in one window, by a user or by everyone.
+
+    Attributes:
+        window: Window id, e.g. 2026-10-17 or 2026-10
+        prompt: Prompt tokens
+        completion: Completion tokens
+        requests: Number of model calls
+        models: Total tokens per model
+        quota: Token quota of the window, 0 if unlimited
+    """
+    window: str
+    prompt: int = 0
+    completion: int = 0
+    requests: int = 0
+    models: Dict[str, int] = field(default_factory=dict)
+    quota: int = 0
+
+    @property
+    def total(self) -> int:
+        return self.prompt + self.completion
+
+    @property
+    def is_exceeded(self) -> bool:
+        return bool(self.quota) and self.total >= self.quota
+
+
+class TokenUsage:
+    """
+    Accounts the LLM tokens each user spends, per UTC day and month.
+
+    Every window has a hash per user and one for everyone, with prompt,
+    completion and request counters plus per-model totals, and a sorted set
+    ranking users by total tokens. A call's usage is added to all of them in
+    one MULTI block. Window keys carry their date, so a new day or month
+    starts from zero and old windows simply expire.
+
+    Unlike the other per-user keys, a user's usage hashes aren't registered
+    in UserKeyRegistry, so logging out leaves them in place: quotas belong
+    to the telegram user rather than the session, and deleting them would
+    let a user reset their quota by logging out and back in, while the
+    everyone hash and the ranking would still count the deleted tokens.
+    """
+
+    @staticmethod
+    def _window_id(window: Tuple[str, str, int], now: float = None) -> str:
+        return time.strftime(window[1], time.gmtime(time.time() if now is None else now))
+
+    @staticmethod
+    def _key(window_id: str, owner) -> str:
+        return f"{TOKEN_USAGE_PREFIX}{window_id}:{owner}"
+
+    @staticmethod
+    def _quota(window: Tuple[str, str, int]) -> int:
+        return settings.LLM_DAILY_TOKEN_QUOTA if window is DAY else settings.LLM_MONTHLY_TOKEN_QUOTA
+
+    @classmethod
+    async def record(cls, user_id: int, model: str, prompt_tokens: int, completion_tokens: int) -> None:
+        """
+        Add the tokens of one model call to the user's and everyone's usage.
+        """
+        total = prompt_tokens + completion_tokens
+        now = time.time()
+        try:
+            pool = await RedisConnection.get_pool()
+            async with pool.pipeline(transaction=True) as pipe:
+                for window in WINDOWS:
+                    window_id = cls._window_id(window, now)
+                    # Not registered for logout cleanup, see the class docstring
+                    for owner in (user_id, "all"):
+                        key = cls._key(window_id, owner)
+                        pipe.hincrby(key, "prompt", prompt_tokens)
+                        pipe.hincrby(key, "completion", completion_tokens)
+                        pipe.hincrby(key, "requests", 1)
+                        pipe.hincrby(key, f"model:{model}", total)
+                        pipe.expire(key, window[2])
+                    top_key = cls._key(window_id, "top")
+                    pipe.zincrby(top_key, total, user_id)
+                    pipe.expire(top_key, window[2])
+                await pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Failed to record token usage of {user_id}: {str(e)}")
+
+    @classmethod
+    async def get(cls, owner="all") -> List[UsageReport]:
+        """
+        Get the current day's and month's usage of a user, or of everyone by default.
+        """
+        pool = await RedisConnection.get_pool()
+        async with pool.pipeline(transaction=False) as pipe:
+            for window in WINDOWS:
+                pipe.hgetall(cls._key(cls._window_id(window), owner))
+            results = await pipe.execute()
+
+        reports = []
+        for window, fields in zip(WINDOWS, results):
+            reports.append(UsageReport(
+                window=cls._window_id(window),
+                prompt=int(fields.get("prompt", 0)),
+                completion=int(fields.get("completion", 0)),
+                requests=int(fields.get("requests", 0)),
+                models={name[len("model:"):]: int(value) for name, value in fields.items() if name.startswith("model:")},
+                quota=cls._quota(window) if owner != "all" else 0,
+            ))
+        return reports
+
+    @classmethod
+    async def get_top_users(cls, count: int = 5) -> List[List[Tuple[str, int]]]:
+        """
+        Get the users who used the most tokens in the current day and month.
+        """
+        pool = await RedisConnection.get_pool()
+        async with pool.pipeline(transaction=False) as pipe:
+            for window in WINDOWS:
+                pipe.zrevrange(cls._key(cls._window_id(window), "top"), 0, count - 1, withscores=True)
+            results = await pipe.execute()
+        return [[(user_id, int(score)) for user_id, score in ranking] for ranking in results]
+
+    @classmethod
+    async def get_exceeded_quota(cls, user_id: int) -> Optional[UsageReport]:
+        """
+        Check a user's quotas before a model call.
+
+        Returns:
+            The report of the first window whose quota the user has used up,
+            or None if the call may go ahead. Quotas aren't enforced when
+            usage can't be read.
+        """
+        if not settings.LLM_DAILY_TOKEN_QUOTA and not settings.LLM_MONTHLY_TOKEN_QUOTA:
+            return None
+        try:
+            reports = await cls.get(user_id)
+        except RedisError as e:
+            logger.warning(f"Failed to read token usage of {user_id}: {str(e)}")
+            return None
+        return next((report for report in reports if report.is_exceeded), None)
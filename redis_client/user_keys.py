@@ -0,0 +1,42 @@
+from config import settings
+
+
+class UserKeyRegistry:
+    """
+    Per-user index of every Redis key written on behalf of a telegram user.
+
+    Writers register their keys in a Redis set next to the write itself, so
+    removing everything that belongs to a user is a single delete that costs
+    O(keys for that user) instead of a keyspace-wide SCAN.
+    """
+
+    @staticmethod
+    def index_key(telegram_id) -> str:
+        """
+        Get the name of the set indexing a user's keys.
+        """
+        return f"user:{telegram_id}:keys"
+
+    @classmethod
+    def register(cls, pipe, telegram_id, *keys: str) -> None:
+        """
+        Queue the registration of ``keys`` for a user on a pipeline.
+
+        The index outlives the longest-lived key it tracks; keys that expire
+        before it are simply ignored by ``delete_all``.
+        """
+        index_key = cls.index_key(telegram_id)
+        pipe.sadd(index_key, *keys)
+        pipe.expire(index_key, settings.USER_KEY_INDEX_TTL)
+
+    @classmethod
+    async def delete_all(cls, pool, telegram_id, *extra_keys: str) -> int:
+        """
+        Delete every registered key of a user, the index itself and any ``extra_keys``.
+
+        Returns:
+            Number of keys that existed and were deleted.
+        """
+        index_key = cls.index_key(telegram_id)
+        keys = await pool.smembers(index_key)
+        return await pool.delete(index_key, *keys, *extra_keys)
@@ -6,14 +6,17 @@ from .auth import router as auth_router
 from .commons import router as commons_router
 from .generic_router import router as generic_router
 from .handlers import router as handlers_router
+from .products import router as products_router
 from .staff import router as staff_router
 
 router = Router(name=__name__)
 
 router.include_routers(
     auth_router,
+    # Before commons, whose catch-all "!" handler answers non-staff users
+    staff_router,
     commons_router,
     handlers_router,
-    staff_router,
+    products_router,
     generic_router,
 )
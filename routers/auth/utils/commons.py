@@ -1,7 +1,17 @@
 from typing import Optional
 
-from api_client.auth_client import TokenPrefix, AuthClient
-from redis_client.connection import RedisConnection
+from api_client.auth_context import AuthContext, get_auth_context
+
+
+def _get_context(telegram_id: int) -> AuthContext:
+    """
+    Reuse the current update's auth context when it belongs to the same user,
+    so its memoized lookups are shared.
+    """
+    context = get_auth_context()
+    if context is not None and str(context.telegram_id) == str(telegram_id):
+        return context
+    return AuthContext(telegram_id)
 
 
 async def is_user_authenticated(telegram_id: int) -> bool:
@@ -9,45 +19,23 @@ async def is_user_authenticated(telegram_id: int) -> bool:
     Check if the user is authenticated.
     Returns True if the user is authenticated, otherwise False.
     """
-    pool = await RedisConnection.get_pool()
-    # Check if access token exists for this user
-    access_token = await pool.get(f"{TokenPrefix.ACCESS.value}{telegram_id}")
-    if access_token:
-        return True
-
-    # Check if refresh token exists
-    refresh_token = await pool.get(f"{TokenPrefix.REFRESH.value}{telegram_id}")
-    return refresh_token is not None
+    # Authenticated if either an access or a refresh token exists for this user
+    return await _get_context(telegram_id).is_authenticated()
 
 
 async def get_auth_token(telegram_id: int) -> Optional[str]:
     """
     Get or refresh the user's access token.
     Returns the token if found or refreshed, None otherwise.
+
+    Tokens are served from the in-process TokenCache when possible, so active
+    users don't pay a Redis round trip on every update.
+    """
+    return await _get_context(telegram_id).get_token()
+
+
+async def is_user_staff(telegram_id: int) -> bool:
+    """
+    Check if the user has staff privileges.
     """
-    pool = await RedisConnection.get_pool()
-
-    # Try to get access token first
-    access_token = await pool.get(f"{TokenPrefix.ACCESS.value}{telegram_id}")
-    if access_token:
-        return access_token.decode('utf-8')
-
-    # If no access token, try to refresh using refresh token
-    refresh_token = await pool.get(f"{TokenPrefix.REFRESH.value}{telegram_id}")
-    if refresh_token:
-        try:
-            # Refresh the token
-            refresh_data = {
-                "refresh": refresh_token.decode('utf-8'),
-                "telegram_id": str(telegram_id)
-            }
-            token_data = await AuthClient.refresh_token(refresh_data)
-
-            # Return the new access token
-            if token_data and "access" in token_data:
-                return token_data["access"]
-        except Exception:
-            # If refresh fails, return None
-            pass
-
-    return None
+    return await _get_context(telegram_id).is_staff()
@@ -1,14 +1,65 @@
+import asyncio
+import logging
+from typing import Dict
+
 import aiogram.utils.markdown as md
 from aiogram import Router, F
 from aiogram.enums import ParseMode
 from aiogram.filters import Command
 from aiogram.types import Message
 from aiogram.utils.chat_action import ChatActionSender
+from aiogram.utils.i18n import I18n
+from aiogram.utils.i18n import gettext as _
 
-from api_client.openrouter_client import generate_customer_support_reply, clear_user_conversation, test_openrouter_connection
+from api_client.llm_scheduler import LlmBusyError, SupersededError, llm_scheduler
+from api_client.openrouter_client import (
+    ConversationPrompt, generate_customer_support_reply, prepare_customer_support_reply,
+    stream_customer_support_reply, clear_user_conversation, test_openrouter_connection
+)
+from config import settings
+from redis_client.intent_stats import IntentStats
+from routers.commons import render_help
+from utils.intents import (
+    HELP, LOGIN, MISSPELLED_COMMAND, REGISTER, UNAVAILABLE_COMMAND, IntentMatch, collect_commands, match_intent
+)
+from utils.debounce import MessageDebouncer
+from utils.messaging import ProgressiveMessage
 
 router = Router(name=__name__)
 
+message_debouncer = MessageDebouncer()
+
+# Commands registered on the whole router tree, collected on first use
+_commands = None
+
+
+def get_registered_commands(i18n: I18n = None) -> Dict[str, str]:
+    """Get the '/' command names the bot accepts, in every locale"""
+    global _commands
+    if _commands is None:
+        root = router
+        while root.parent_router is not None:
+            root = root.parent_router
+        _commands = collect_commands(root, i18n)
+    return _commands
+
+
+async def answer_intent(message: Message, intent: IntentMatch) -> None:
+    """Answer a message the intent router recognized, without the AI assistant"""
+    if intent.intent == HELP:
+        await message.reply(render_help(), parse_mode=ParseMode.HTML)
+    elif intent.intent == LOGIN:
+        await message.reply(_("To log in to your account, send /login and follow the steps."))
+    elif intent.intent == REGISTER:
+        await message.reply(_("To create a new account, send /register and follow the steps."))
+    elif intent.intent == MISSPELLED_COMMAND:
+        await message.reply(_("Unknown command. Did you mean /{command}?").format(command=intent.command))
+    elif intent.intent == UNAVAILABLE_COMMAND:
+        await message.reply(_("/{command} isn't available right now. Send /help to see what you can do.").format(
+            command=intent.command))
+    else:
+        await message.reply(_("Unknown command. Send /help to see the available commands."))
+
 
 @router.message(Command('clear_chat', prefix='/'))
 async def command_clear_chat(message: Message) -> None:
@@ -55,27 +106,80 @@ async def command_test_ai(message: Message) -> None:
         )
 
 
-@router.message(F.text)
-async def generate_using_ai(message: Message):
-    # Show typing indicator
-    async with ChatActionSender.typing(
-            bot=message.bot,
-            chat_id=message.chat.id,
-    ):
+async def reply_using_ai(message: Message, text: str, user_id: int, prompt: ConversationPrompt = None) -> None:
+    """Reply to a message with the AI assistant's answer to the text, using its prompt if already prepared"""
+    if settings.LLM_STREAMING:
+        # Show the reply as it is generated, so users wait only for the first tokens
+        reply = ProgressiveMessage(message)
         try:
-            # Get user ID for session tracking
-            user_id = message.from_user.id
-
-            # Get AI response with user context
-            ai_response = await generate_customer_support_reply(message.text, user_id=user_id)
-
-            # Reply to user
-            await message.reply(ai_response, parse_mode=ParseMode.MARKDOWN)
-        except Exception as e:
-            logger = logging.getLogger(__name__)
-            logger.exception(f"Error generating AI response: {str(e)}")
-            await message.reply(
-                md.hbold("❌ Error") + "\n\n" +
-                f"I couldn't process your request",
-                parse_mode=ParseMode.HTML,
+            ai_response = await stream_customer_support_reply(
+                text, user_id=user_id, on_text=reply.update, prompt=prompt
             )
+        except asyncio.CancelledError:
+            # Superseded by a newer message; its reply replaces this one
+            await reply.discard()
+            raise
+        await reply.finish(ai_response, parse_mode=ParseMode.MARKDOWN)
+        return
+
+    # Get AI response with user context
+    ai_response = await generate_customer_support_reply(text, user_id=user_id, prompt=prompt)
+
+    # Reply to user
+    await message.reply(ai_response, parse_mode=ParseMode.MARKDOWN)
+
+
+@router.message(F.text)
+async def generate_using_ai(message: Message, i18n: I18n = None):
+    if settings.INTENT_ROUTER:
+        # Questions the bot can answer itself never reach the AI assistant
+        intent = match_intent(message.text, get_registered_commands(i18n))
+        await IntentStats.record(intent.intent if intent else None)
+        if intent is not None:
+            await answer_intent(message, intent)
+            return
+
+    # A message sent while the user's previous turn is in flight waits for
+    # the user to finish typing, and the messages form one turn
+    text = await message_debouncer.collect(message.chat.id, message.text)
+    if text is None:
+        return
+
+    with message_debouncer.turn(message.chat.id):
+        # Show typing indicator
+        async with ChatActionSender.typing(
+                bot=message.bot,
+                chat_id=message.chat.id,
+        ):
+            try:
+                # Get user ID for session tracking
+                user_id = message.from_user.id
+
+                # Cached answers and quota rejections don't need a model, so they don't queue for one
+                prompt, local_reply = await prepare_customer_support_reply(text, user_id=user_id)
+                if local_reply is not None:
+                    await message.reply(local_reply, parse_mode=ParseMode.MARKDOWN)
+                    return
+
+                # Wait for the user's turn; a newer message cancels the reply in progress
+                # and is answered together with it, from a prompt prepared for the merged text
+                await llm_scheduler.submit(
+                    user_id, text,
+                    lambda merged_text: reply_using_ai(
+                        message, merged_text, user_id, prompt if merged_text == text else None
+                    ),
+                    preempt=True,
+                )
+            except SupersededError:
+                # Merged into the user's next message, which gets the reply
+                return
+            except LlmBusyError:
+                await message.reply(_("The assistant is busy right now. Please try again in a minute."))
+            except Exception as e:
+                logger = logging.getLogger(__name__)
+                logger.exception(f"Error generating AI response: {str(e)}")
+                await message.reply(
+                    md.hbold("❌ Error") + "\n\n" +
+                    f"I couldn't process your request",
+                    parse_mode=ParseMode.HTML,
+                )
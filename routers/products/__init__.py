@@ -2,8 +2,12 @@ __all__ = ('router',)
 
 from aiogram import Router
 
+from .all_products import router as all_products_router
+from .user_products import router as user_products_router
+
 router = Router(name=__name__)
 
 router.include_routers(
-
+    all_products_router,
+    user_products_router,
 )
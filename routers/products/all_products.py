@@ -1,27 +1,59 @@
-from aiogram import Router
-from aiogram.filters import Command
-from aiogram.types import Message
+from aiogram import Router, F
+from aiogram.types import Message, CallbackQuery
 from api_client.product_client import ProductClient
 from aiogram.utils.i18n import I18n
 from aiogram.utils.i18n import gettext as _
-from keyboards.inline_keyboards.products import get_public_product_keyboard
+from keyboards.inline_keyboards.products import get_public_product_keyboard, get_products_pagination_keyboard
 from renderers.product_renderer import render_product_short
+from utils.commands import LocalizedCommand
 from utils.messaging import send_message_with_optional_photo
 
 router = Router(name=__name__)
 
+PRODUCTS_PAGE_PREFIX = 'products_page_'
 
-@router.message(Command('products', _('products'), prefix='/', ignore_case=True))
-async def list_products(message: Message, i18n: I18n) -> None:
+
+async def send_products_page(message: Message, page: int) -> None:
     """
-    This handler will be called when user sends `/products` command
+    Sends a single page of products, followed by a button for the next page if there is one.
+    Only the requested page is fetched from the backend.
     """
-    products = await ProductClient.list_products()
-    if not products:
+    products_page = await ProductClient.get_products_page(page=page)
+    if not products_page.items:
         await message.answer(_('There are no products available at the moment.'))
         return
 
-    for product in products:
+    for product in products_page.items:
         text, thumbnail_url = render_product_short(product)
         keyboard = get_public_product_keyboard(product.id)
         await send_message_with_optional_photo(message, text, thumbnail_url, keyboard)
+
+    if products_page.has_next:
+        await message.answer(
+            _('Page {page}').format(page=page),
+            reply_markup=get_products_pagination_keyboard(page + 1),
+        )
+
+
+@router.message(LocalizedCommand('products', prefix='/', ignore_case=True))
+async def list_products(message: Message, i18n: I18n) -> None:
+    """
+    This handler will be called when user sends `/products` command
+    """
+    await send_products_page(message, page=1)
+
+
+@router.callback_query(F.data.startswith(PRODUCTS_PAGE_PREFIX))
+async def list_products_page(callback: CallbackQuery) -> None:
+    """
+    This handler will be called when user asks for the next page of products
+    """
+    try:
+        page = int(callback.data.removeprefix(PRODUCTS_PAGE_PREFIX))
+    except ValueError:
+        await callback.answer(_('Invalid page.'), show_alert=True)
+        return
+
+    await callback.answer()
+    if callback.message:
+        await send_products_page(callback.message, page)
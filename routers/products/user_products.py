@@ -1,17 +1,17 @@
 from aiogram import Router
-from aiogram.filters import Command
 from aiogram.types import Message
 from api_client.product_client import ProductClient
 from aiogram.utils.i18n import I18n
 from aiogram.utils.i18n import gettext as _
 from keyboards.inline_keyboards.products import get_product_management_keyboard
 from renderers.product_renderer import render_product_short
+from utils.commands import LocalizedCommand
 from utils.messaging import send_message_with_optional_photo
 
 router = Router(name=__name__)
 
 
-@router.message(Command('my_products', _('my_products'), prefix='/', ignore_case=True))
+@router.message(LocalizedCommand('my_products', prefix='/', ignore_case=True))
 async def my_products(message: Message, i18n: I18n) -> None:
     """
     This function retrieves the user's products and displays them as separate messages,
@@ -25,16 +25,17 @@ async def my_products(message: Message, i18n: I18n) -> None:
         None: Messages are sent directly to the user via the message.answer method
     """
 
-    # Retrieve all products belonging to the current user
-    products = await ProductClient.my_products()
-
-    # If no products found, inform the user and exit
-    if not products:
-        await message.answer(_('You have no products.'))
-        return
+    # Stream the user's products page by page so the first ones are shown
+    # before the rest have been fetched
+    has_products = False
 
     # Display each product as a separate message with management options
-    for product in products:
+    async for product in ProductClient.iter_my_products():
+        has_products = True
         text, thumbnail_url = render_product_short(product)  # Format product details as text
         keyboard = get_product_management_keyboard(product.id)  # Create inline keyboard for this product
         await send_message_with_optional_photo(message, text, thumbnail_url, keyboard)
+
+    # If no products found, inform the user
+    if not has_products:
+        await message.answer(_('You have no products.'))
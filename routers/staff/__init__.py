@@ -1,16 +1,20 @@
 __all__ = ('router',)
 
-from aiogram import Router
+from aiogram import F, Router
 
 from .commons import router as commons_router
 from .filters import IsStaff
+from .usage import router as usage_router
 from .users import router as users_router
 
 router = Router(name=__name__)
 
-router.message.filter(IsStaff())
+# Staff commands all start with "!"; check that first so ordinary chat
+# messages never trigger a staff status lookup
+router.message.filter(F.text.startswith('!'), IsStaff())
 
 router.include_routers(
     users_router,
+    usage_router,
     commons_router,
 )
@@ -11,6 +11,7 @@ async def get_help(message: Message):
         text=(
             "Available commands:\n"
             "!users - Get the list of users\n"
+            "!usage [telegram_id] - Get the AI assistant's token usage\n"
             "!help - Get this help message\n"
         )
     )
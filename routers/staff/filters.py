@@ -1,19 +1,13 @@
 from aiogram.filters import BaseFilter
 from aiogram.types import Message, CallbackQuery
 
-from api_client.auth_client import AuthClient
+from routers.auth.utils.commons import is_user_staff
 
 
 class IsStaff(BaseFilter):
     """Magic filter that checks if a user has staff privileges."""
 
     async def __call__(self, obj, **kwargs) -> bool:
-        if isinstance(obj, Message):
-            telegram_id = obj.from_user.id
-        elif isinstance(obj, CallbackQuery):
-            telegram_id = obj.from_user.id
-        else:
-            print('IsStaff Filter: Unsupported object type', type(obj))
+        if not isinstance(obj, (Message, CallbackQuery)) or obj.from_user is None:
             return False
-        print('IsStaff Filter ', telegram_id)
-        return await AuthClient.is_staff(str(telegram_id))
+        return await is_user_staff(obj.from_user.id)
@@ -0,0 +1,79 @@
+import aiogram.utils.markdown as md
+from aiogram import Router
+from aiogram.enums import ParseMode
+from aiogram.filters import Command
+from aiogram.types import Message
+
+from redis_client.token_usage import TokenUsage, UsageReport
+from utils.decorators import validate_command
+
+router = Router(name=__name__)
+
+
+def render_usage_report(report: UsageReport) -> str:
+    quota = f" / {report.quota}" if report.quota else ""
+    lines = [
+        md.text(md.hbold(f"{report.window}:"), f"{report.total}{quota} tokens in {report.requests} requests"),
+        md.text(f"Prompt: {report.prompt}, completion: {report.completion}"),
+    ]
+    lines.extend(md.text("•", md.hcode(model), tokens) for model, tokens in
+                 sorted(report.models.items(), key=lambda item: item[1], reverse=True))
+    return md.text(*lines, sep='\n')
+
+
+@router.message(Command('usage', prefix='!'))
+@validate_command(
+    params=[{"name": "Telegram ID", "type": int, "description": "Optional user to show; everyone by default"}],
+    min_args=0,
+)
+async def get_usage(message: Message, command_args, *args, **kwargs):
+    """
+    Handler for the !usage command.
+    Shows the AI assistant's token usage for the current day and month.
+
+    Usage: !usage [telegram_id]
+    """
+    try:
+        if command_args:
+            try:
+                telegram_id = int(command_args[0])
+            except ValueError:
+                await message.answer(
+                    text=md.text(
+                        md.hbold("Error:"),
+                        md.text("Telegram ID must be a number."),
+                        f"Usage: {md.hcode('!usage [telegram_id]')}",
+                        sep='\n'
+                    ),
+                    parse_mode=ParseMode.HTML,
+                )
+                return
+
+            reports = await TokenUsage.get(telegram_id)
+            await message.answer(
+                text=md.text(
+                    md.hbold(f"Token usage of {telegram_id}"),
+                    *map(render_usage_report, reports),
+                    sep='\n\n'
+                ),
+                parse_mode=ParseMode.HTML,
+            )
+            return
+
+        reports = await TokenUsage.get()
+        rankings = await TokenUsage.get_top_users()
+        sections = [md.hbold("Token usage of all users")]
+        for report, ranking in zip(reports, rankings):
+            top_users = [md.text("•", md.hcode(user_id), tokens) for user_id, tokens in ranking]
+            sections.append(md.text(render_usage_report(report), md.text("Top users:"), *top_users, sep='\n')
+                            if top_users else render_usage_report(report))
+        await message.answer(text=md.text(*sections, sep='\n\n'), parse_mode=ParseMode.HTML)
+    except Exception as e:
+        await message.reply(
+            text=md.text(
+                md.hbold("Error retrieving token usage:"),
+                md.hcode(str(e)),
+                sep='\n'
+            ),
+            parse_mode=ParseMode.HTML
+        )
@@ -4,7 +4,7 @@ from api_client import UserClient
 
 async def send_user_info(target, user_id: int):
     try:
-        user = await UserClient.get_user(user_id)
+        user = await UserClient.load_user(user_id)
         user_info = md.text(
             md.hbold("User Information:"),
             md.text(md.hbold("ID:"), user.id),
@@ -0,0 +1,39 @@
+"""
+Microbenchmark of the per-request signing cost.
+
+Prints the average cost in microseconds of matching a URL against the
+backend patterns and of signing a JSON body of roughly ``--body-size`` bytes.
+
+Usage: python -m scripts.benchmark_signing [--iterations N] [--body-size BYTES]
+"""
+import argparse
+import timeit
+
+from aiohttp import payload
+from yarl import URL
+
+from middlewares.signature_middleware import SignatureMiddleware
+
+
+def benchmark_signing(iterations: int = 100_000, body_size: int = 512) -> dict:
+    middleware = SignatureMiddleware(secret_key="benchmark", backend_urls="http://localhost:8000/")
+    url = URL("http://localhost:8000/api/v1/shop/products/1/")
+    body = payload.BytesPayload(b"x" * body_size)
+
+    match_time = timeit.timeit(lambda: middleware._should_sign_request(url), number=iterations)
+    sign_time = timeit.timeit(
+        lambda: middleware._create_manual_signature("POST", url.raw_path, body), number=iterations
+    )
+    return {
+        "match_us": match_time / iterations * 1e6,
+        "sign_us": sign_time / iterations * 1e6,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=100_000)
+    parser.add_argument("--body-size", type=int, default=512)
+    args = parser.parse_args()
+    for name, cost in benchmark_signing(args.iterations, args.body_size).items():
+        print(f"{name}: {cost:.2f}")
@@ -0,0 +1,40 @@
+import hashlib
+import io
+import os
+import unittest
+
+import aiohttp
+
+os.environ.setdefault("BOT_TOKEN", "test")
+
+from middlewares.signature_middleware import _HashingWriter, check_body_signing, feed_body  # noqa: E402
+
+
+class FeedBodyTest(unittest.IsolatedAsyncioTestCase):
+    """feed_body must hash exactly the bytes aiohttp sends, or backend signatures break."""
+
+    async def assert_signs_sent_bytes(self, body) -> None:
+        signed, sent = hashlib.sha256(), hashlib.sha256()
+        await feed_body(body, signed)
+        await body.write(_HashingWriter(sent))
+        self.assertEqual(signed.hexdigest(), sent.hexdigest())
+
+    async def test_startup_check_passes(self):
+        await check_body_signing()
+
+    async def test_multipart_writer(self):
+        with aiohttp.MultipartWriter("form-data") as body:
+            body.append("value", {"Content-Disposition": 'form-data; name="field"'})
+            body.append_json({"name": "منتج", "price": 10})
+            body.append(io.BytesIO(b"\x00\x01" * 100_000), {"Content-Type": "application/octet-stream"})
+        await self.assert_signs_sent_bytes(body)
+
+    async def test_form_data_upload(self):
+        form = aiohttp.FormData()
+        form.add_field("name", "product")
+        form.add_field("thumbnail", io.BytesIO(b"image bytes"), filename="thumb.png", content_type="image/png")
+        await self.assert_signs_sent_bytes(form())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,32 @@
+from aiogram.filters import Command, CommandObject
+from aiogram.filters.command import CommandException
+from aiogram.utils.i18n import gettext as _
+
+
+class LocalizedCommand(Command):
+    """
+    Command filter that also accepts each command name's translation in the user's locale.
+
+    Translations are looked up when a message is checked rather than when the
+    filter is declared, since no locale is known at import time. The i18n
+    middleware must therefore run as an outer middleware, before filters.
+    """
+
+    def validate_command(self, command: CommandObject) -> CommandObject:
+        try:
+            return super().validate_command(command)
+        except CommandException:
+            pass
+
+        name = command.command.casefold() if self.ignore_case else command.command
+        for allowed_command in self.commands:
+            if not isinstance(allowed_command, str):
+                continue
+            try:
+                translated = _(allowed_command)
+            except LookupError:
+                # No i18n context: only the untranslated names are accepted
+                break
+            if name == (translated.casefold() if self.ignore_case else translated):
+                return command
+        raise CommandException("Command did not match pattern")
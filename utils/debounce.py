@@ -0,0 +1,75 @@
+import asyncio
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Hashable, Iterator, List, Optional
+
+from config import settings
+
+
+@dataclass
+class _Batch:
+    texts: List[str] = field(default_factory=list)
+    version: int = 0
+
+
+class MessageDebouncer:
+    """
+    Collects messages that arrive while an earlier one is still being answered into one.
+
+    A message for a key with no turn in flight (see ``turn``) and none
+    waiting is handed back at once. Otherwise every message restarts the
+    key's quiet period; once ``delay`` seconds pass without another one,
+    the caller that sent the last message gets all of them joined by
+    newlines and every earlier caller gets None.
+
+    Attributes:
+        merged: Number of messages folded into a later one
+    """
+
+    def __init__(self, delay: float = None):
+        self._delay = settings.LLM_DEBOUNCE_DELAY if delay is None else delay
+        self._batches: Dict[Hashable, _Batch] = {}
+        self._in_flight: Counter = Counter()
+        self.merged = 0
+
+    @contextmanager
+    def turn(self, key: Hashable) -> Iterator[None]:
+        """
+        Mark a turn of the key as in flight, so messages arriving meanwhile are collected.
+        """
+        self._in_flight[key] += 1
+        try:
+            yield
+        finally:
+            self._in_flight[key] -= 1
+            if not self._in_flight[key]:
+                del self._in_flight[key]
+
+    async def collect(self, key: Hashable, text: str) -> Optional[str]:
+        """
+        Add a message and, if the key has a turn in flight or messages waiting,
+        wait for it to go quiet.
+
+        Returns:
+            The merged text for the last message's caller, None for the others.
+        """
+        if key not in self._batches and not self._in_flight[key]:
+            return text
+        batch = self._batches.setdefault(key, _Batch())
+        if batch.texts:
+            self.merged += 1
+        batch.texts.append(text)
+        batch.version += 1
+        version = batch.version
+
+        try:
+            await asyncio.sleep(self._delay)
+        except asyncio.CancelledError:
+            if batch.version == version:
+                self._batches.pop(key, None)
+            raise
+        if batch.version != version:
+            return None
+        del self._batches[key]
+        return "\n".join(batch.texts)
@@ -0,0 +1,161 @@
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional
+
+from aiogram import Router
+from aiogram.filters import Command
+from aiogram.utils.i18n import I18n
+
+from config import settings
+from utils.text import edit_distance, normalize_text
+
+# Intents answered from templates instead of the AI assistant
+LOGIN = "login"
+REGISTER = "register"
+HELP = "help"
+MISSPELLED_COMMAND = "misspelled_command"
+UNKNOWN_COMMAND = "unknown_command"
+UNAVAILABLE_COMMAND = "unavailable_command"
+
+# Greetings and question openers that may precede an intent, English and Arabic
+_LEAD = (
+    r"(?:(?:hi|hello|please|مرحبا|لو سمحت|من فضلك) )*"
+    r"(?:(?:how|where) (?:do|can|should) (?:i|we) |how to |i (?:want|need)(?: to)? |can i "
+    r"|(?:كيف|ازاي|شلون|وين|بدي|اريد|ممكن|بقدر|اقدر|بعرف|اعرف) ){0,3}"
+)
+# Where the intent applies and closing courtesies that may follow it
+_TAIL = (
+    r"(?: (?:to|into|in|on|with) (?:my |the |this )?(?:account|bot|shop|store)"
+    r"| (?:علي|في|الي|ب|ل)? ?(?:ال)?(?:حسابي|حساب|بوت|متجر|موقع))?"
+    r"(?: (?:please|لو سمحت|من فضلك))?"
+)
+
+
+def _rule(phrases: str) -> re.Pattern:
+    """
+    Match messages that consist of an intent phrase and nothing but a lead and a tail,
+    so questions that merely mention the intent's words are left to the assistant.
+    """
+    return re.compile(rf"^{_LEAD}(?:{phrases}){_TAIL}$")
+
+
+# Rules over normalized text (see normalize_text), English and Arabic
+_KEYWORD_RULES = {
+    LOGIN: _rule(
+        r"log ?in|sign ?in"
+        r"|(?:تسجيل|اسجل|نسجل|سجل|بسجل) ?(?:ال)?دخول|ادخل|ندخل"
+    ),
+    REGISTER: _rule(
+        r"register|sign ?up|(?:create|open|make) (?:an |a |my )?(?:new )?account"
+        r"|(?:انشاء|انشئ|اعمل|افتح|فتح|عمل|اسوي) ?(?:ال)?حساب(?: جديد)?|حساب جديد"
+        r"|(?:تسجيل|اسجل|نسجل|سجل|بسجل)(?: (?:حساب|جديد))?"
+    ),
+    HELP: _rule(
+        r"help|commands|(?:what|which) (?:are )?(?:the |your )?(?:available )?commands"
+        r"(?: (?:are )?(?:there|available)| do you have| can i use)?"
+        r"|what can (?:you|i) do(?: here)?|use (?:the |this )?bot"
+        r"|مساعده|ساعدني|(?:(?:شو|ما|ماهي|ما هي|ايش) )?(?:ال)?اوامر(?: (?:ال)?متاحه)?|(?:استخدم|استعمل) (?:ال)?(?:بوت|نظام)"
+    ),
+}
+
+@dataclass
+class IntentMatch:
+    """
+    A message the bot can answer without the AI assistant.
+
+    Attributes:
+        intent: One of the intent names above
+        command: Registered command the answer points to, if any
+        typed: Command name as the user typed it, for command intents
+    """
+    intent: str
+    command: Optional[str] = None
+    typed: Optional[str] = None
+
+
+def collect_commands(router: Router, i18n: Optional[I18n] = None) -> Dict[str, str]:
+    """
+    Collect the '/' commands registered on a router tree.
+
+    Returns:
+        Mapping of every accepted command name, including its translation in
+        each available locale, to the command's canonical name.
+    """
+    commands: Dict[str, str] = {}
+
+    def walk(current: Router) -> None:
+        for handler in current.message.handlers:
+            for handler_filter in handler.filters or ():
+                command_filter = handler_filter.callback
+                if not isinstance(command_filter, Command) or command_filter.prefix != "/":
+                    continue
+                names = [name for name in command_filter.commands if isinstance(name, str)]
+                for name in names:
+                    commands.setdefault(name.lower(), names[0])
+                    for locale in i18n.available_locales if i18n else ():
+                        commands.setdefault(i18n.gettext(name, locale=locale).lower(), names[0])
+        for sub_router in current.sub_routers:
+            walk(sub_router)
+
+    walk(router)
+    return commands
+
+
+def closest_command(name: str, commands: Iterable[str], max_distance: Optional[int] = None) -> Optional[str]:
+    """
+    Find the command name closest to a misspelled one, if any is close enough.
+    A third of the name's letters may be wrong, unless max_distance is given.
+    """
+    best, best_distance = None, (max_distance if max_distance is not None else max(1, len(name) // 3)) + 1
+    for command in commands:
+        distance = edit_distance(name, command)
+        if distance < best_distance:
+            best, best_distance = command, distance
+    return best
+
+
+def match_intent(text: str, commands: Dict[str, str]) -> Optional[IntentMatch]:
+    """
+    Recognize messages that don't need the AI assistant.
+
+    Handles commands that aren't registered or aren't available in the
+    current state, single words that look like a misspelled command name,
+    and how-to questions that are only about logging in, registering or the
+    available commands. Messages matching none of these, or several, are
+    left for the assistant.
+
+    Args:
+        text: Message text
+        commands: Registered command names, as returned by collect_commands
+    """
+    stripped = text.strip()
+    if stripped.startswith("/"):
+        typed = stripped[1:].split(maxsplit=1)[0].split("@")[0].lower() if len(stripped) > 1 else ""
+        if typed in commands:
+            return IntentMatch(UNAVAILABLE_COMMAND, command=commands[typed], typed=typed)
+        closest = closest_command(typed, commands) if typed else None
+        if closest is None:
+            return IntentMatch(UNKNOWN_COMMAND, typed=typed)
+        return IntentMatch(MISSPELLED_COMMAND, command=commands[closest], typed=typed)
+
+    normalized = normalize_text(text)
+    words = normalized.split()
+    if not words or len(words) > settings.INTENT_MAX_WORDS:
+        return None
+
+    # A command name typed without its slash is an ordinary word, not a misspelling.
+    # Without a slash a short word is more likely an ordinary word ("helo"),
+    # so only long words one letter off a command are answered from a template
+    if (len(words) == 1 and words[0] not in commands
+            and len(words[0]) >= settings.INTENT_FUZZY_MIN_LENGTH):
+        closest = closest_command(words[0], commands, max_distance=1)
+        if closest is not None:
+            command = commands[closest]
+            if command in _KEYWORD_RULES:
+                return IntentMatch(command, command=command)
+            return IntentMatch(MISSPELLED_COMMAND, command=command, typed=words[0])
+
+    matched = [intent for intent, pattern in _KEYWORD_RULES.items() if pattern.match(normalized)]
+    if len(matched) != 1:
+        return None
+    return IntentMatch(matched[0], command=matched[0])
@@ -1,6 +1,20 @@
+import asyncio
+import logging
+import time
+
+from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
 from aiogram.types import Message, InlineKeyboardMarkup
 from typing import Optional
 
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Longest text Telegram accepts in a single message
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+
 async def send_message_with_optional_photo(
     message: Message,
     text: str,
@@ -15,3 +29,105 @@ async def send_message_with_optional_photo(
     else:
         await message.answer(text, reply_markup=reply_markup)
 
+
+class ProgressiveMessage:
+    """
+    A reply that grows in place while its text is being generated.
+
+    The first update sends the reply; later updates only record the latest
+    text, and a single pending edit writes it at most once per ``interval``
+    so streaming stays within Telegram's edit rate limits. Intermediate
+    edits are plain text, since a half-written reply is rarely valid
+    Markdown. ``finish`` writes the final text, formatted, and sends
+    whatever exceeds one message as follow-up replies.
+    """
+
+    def __init__(self, message: Message, interval: float = settings.STREAM_EDIT_INTERVAL):
+        self._message = message
+        self._interval = interval
+        self._sent: Optional[Message] = None
+        self._text = ""
+        self._shown = ""
+        self._next_edit_at = 0.0
+        self._pending: Optional[asyncio.Task] = None
+
+    @property
+    def is_sent(self) -> bool:
+        return self._sent is not None
+
+    async def update(self, text: str) -> None:
+        """Show the text generated so far"""
+        self._text = text
+        if self._sent is None:
+            self._shown = text[:TELEGRAM_MESSAGE_LIMIT]
+            self._sent = await self._message.reply(self._shown, parse_mode=None)
+            self._next_edit_at = time.monotonic() + self._interval
+        elif self._pending is None or self._pending.done():
+            self._pending = asyncio.create_task(self._edit_later())
+
+    async def _edit_later(self) -> None:
+        delay = self._next_edit_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        try:
+            await self._edit(self._text[:TELEGRAM_MESSAGE_LIMIT])
+        except TelegramRetryAfter as e:
+            # Skip this edit; the next update or the final edit catches up
+            self._next_edit_at = time.monotonic() + e.retry_after
+        except Exception as e:
+            logger.warning(f"Failed to update streamed message: {str(e)}")
+
+    async def _edit(self, text: str, parse_mode: Optional[str] = None) -> None:
+        if text == self._shown and parse_mode is None:
+            return
+        try:
+            await self._sent.edit_text(text, parse_mode=parse_mode)
+        except TelegramBadRequest as e:
+            if "message is not modified" not in str(e):
+                raise
+        self._shown = text
+        self._next_edit_at = time.monotonic() + self._interval
+
+    async def _write(self, text: str, parse_mode: Optional[str], first: bool) -> None:
+        """Write one chunk of the final text, falling back to plain text if it isn't valid markup"""
+        for mode in (parse_mode, None) if parse_mode else (None,):
+            try:
+                if first and self._sent is not None:
+                    await self._edit(text, mode)
+                else:
+                    sent = await self._message.reply(text, parse_mode=mode)
+                    if first:
+                        self._sent, self._shown = sent, text
+                return
+            except TelegramRetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+                return await self._write(text, mode, first)
+            except TelegramBadRequest as e:
+                if mode is None:
+                    raise
+                logger.debug(f"Falling back to plain text for streamed message: {str(e)}")
+
+    async def finish(self, text: str, parse_mode: Optional[str] = ParseMode.MARKDOWN) -> None:
+        """Write the final text, replacing whatever was shown while streaming"""
+        if self._pending is not None and not self._pending.done():
+            self._pending.cancel()
+            try:
+                await self._pending
+            except asyncio.CancelledError:
+                pass
+        self._text = text
+
+        chunks = [text[i:i + TELEGRAM_MESSAGE_LIMIT] for i in range(0, len(text), TELEGRAM_MESSAGE_LIMIT)] or [text]
+        for index, chunk in enumerate(chunks):
+            await self._write(chunk, parse_mode, first=index == 0)
+
+    async def discard(self) -> None:
+        """Delete what was shown so far, when the reply is abandoned"""
+        if self._pending is not None and not self._pending.done():
+            self._pending.cancel()
+        if self._sent is not None:
+            try:
+                await self._sent.delete()
+            except TelegramBadRequest as e:
+                logger.debug(f"Failed to delete abandoned streamed message: {str(e)}")
+            self._sent = None
@@ -0,0 +1,45 @@
+import re
+import unicodedata
+
+# Harakat, superscript alef and Quranic annotation marks
+_ARABIC_DIACRITICS = re.compile("[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed]")
+_TATWEEL = "\u0640"
+
+_LETTER_VARIANTS = str.maketrans({
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+    "ى": "ي",
+    "ة": "ه",
+    # Arabic-Indic and Eastern Arabic-Indic digits
+    **{chr(0x0660 + digit): str(digit) for digit in range(10)},
+    **{chr(0x06f0 + digit): str(digit) for digit in range(10)},
+})
+
+
+def normalize_text(text: str) -> str:
+    """
+    Reduce a message to a canonical form for matching.
+
+    Arabic diacritics and tatweel are stripped, alef, yaa and taa marbuta
+    variants are unified, digits are made ASCII, Latin letters are
+    lowercased, and punctuation, symbols and whitespace collapse into
+    single spaces.
+    """
+    text = _ARABIC_DIACRITICS.sub("", text.replace(_TATWEEL, ""))
+    text = text.translate(_LETTER_VARIANTS).casefold()
+    text = "".join(" " if unicodedata.category(char)[0] in "PSZC" else char for char in text)
+    return " ".join(text.split())
+
+
+def edit_distance(a: str, b: str) -> int:
+    """
+    Levenshtein distance between two strings.
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]